@@ -10,10 +10,14 @@ Based on IPCC AR6 regional climate projections and CMIP6 multi-model means.
 
 import os
 import sys
+import hashlib
 import numpy as np
 from datetime import datetime
 import psycopg2
 from psycopg2.extras import execute_values
+from pipelined_writer import PipelinedWriter
+from import_journal import ImportJournal
+from risk_levels import with_risk_levels, refresh_composite_scores
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 if not DATABASE_URL:
@@ -26,8 +30,20 @@ GRID_LONS = list(range(-180, 180, 5))  # -180 to 175
 
 SCENARIOS = ["ssp126", "ssp245", "ssp370", "ssp585"]
 
+INDICATORS = [
+    ("tas", "°C", "Temperature Anomaly"),
+    ("tasmax", "°C", "Max Temp Anomaly"),
+    ("tasmin", "°C", "Min Temp Anomaly"),
+    ("pr", "mm/year", "Precipitation"),
+    ("hd35", "days", "Hot Days >35°C"),
+    ("cdd", "days", "Consecutive Dry Days"),
+]
+
 TIME_PERIODS = ["2030", "2050", "2070", "2090"]
 
+# Latitude rows per journaled import unit (~2000 records per batch)
+RESUME_CHUNK_LATS = 5
+
 # CMIP6 Global Warming Levels by scenario and time period (°C above pre-industrial)
 # Based on IPCC AR6 WG1 Table 4.2 best estimates
 GLOBAL_WARMING = {
@@ -141,12 +157,33 @@ def get_precip_sensitivity(lat, lon):
     else:
         return PRECIP_CHANGE_PER_DEGREE["subantarctic"]
 
+# Standard deviation of the multiplicative regional variation (±15%)
+REGIONAL_VARIATION_SD = 0.15
+
+def stable_seed(key):
+    """Seed from a string that, unlike hash(), is the same in every process"""
+    return int(hashlib.md5(key.encode()).hexdigest()[:8], 16)
+
 def add_regional_variation(value, lat, lon, seed):
     """Add realistic regional variation"""
     np.random.seed(int(abs(lat * 1000 + lon * 100 + seed)) % 2**31)
-    variation = np.random.normal(0, 0.15)  # ±15% variation
+    variation = np.random.normal(0, REGIONAL_VARIATION_SD)
     return value * (1 + variation)
 
+def is_land(lat, lon):
+    """Simple continental mask based on latitude/longitude boxes"""
+    if -130 < lon < -60 and 10 < lat < 70:  # North America
+        return True
+    elif -80 < lon < -35 and -55 < lat < 10:  # South America
+        return True
+    elif -20 < lon < 60 and -35 < lat < 70:  # Europe/Africa
+        return True
+    elif 60 < lon < 150 and -10 < lat < 70:  # Asia
+        return True
+    elif 110 < lon < 155 and -45 < lat < -10:  # Australia
+        return True
+    return False
+
 def calculate_temp_anomaly(lat, lon, scenario, time_period):
     """Calculate temperature anomaly relative to 1950-1980 baseline"""
     global_warming = GLOBAL_WARMING[scenario][time_period]
@@ -156,24 +193,11 @@ def calculate_temp_anomaly(lat, lon, scenario, time_period):
     anomaly = global_warming * amplification
     
     # Add land/ocean contrast (land warms faster)
-    # Simple continental mask based on longitude
-    is_land = False
-    if -130 < lon < -60 and 10 < lat < 70:  # North America
-        is_land = True
-    elif -80 < lon < -35 and -55 < lat < 10:  # South America
-        is_land = True
-    elif -20 < lon < 60 and -35 < lat < 70:  # Europe/Africa
-        is_land = True
-    elif 60 < lon < 150 and -10 < lat < 70:  # Asia
-        is_land = True
-    elif 110 < lon < 155 and -45 < lat < -10:  # Australia
-        is_land = True
-    
-    if is_land:
+    if is_land(lat, lon):
         anomaly *= 1.3  # Land warms 30% more than global average
     
     # Add regional variation
-    anomaly = add_regional_variation(anomaly, lat, lon, hash(f"{scenario}{time_period}"))
+    anomaly = add_regional_variation(anomaly, lat, lon, stable_seed(f"{scenario}{time_period}"))
     
     return round(anomaly, 2)
 
@@ -190,7 +214,7 @@ def calculate_precip(lat, lon, scenario, time_period):
     projected = baseline * (1 + pct_change / 100)
     
     # Add variation
-    projected = add_regional_variation(projected, lat, lon, hash(f"pr{scenario}{time_period}"))
+    projected = add_regional_variation(projected, lat, lon, stable_seed(f"pr{scenario}{time_period}"))
     
     return round(max(50, projected), 1)  # Minimum 50mm/year
 
@@ -207,7 +231,7 @@ def calculate_hot_days(lat, lon, scenario, time_period):
     else:
         hot_days = 0
     
-    hot_days = add_regional_variation(hot_days, lat, lon, hash(f"hd{scenario}{time_period}"))
+    hot_days = add_regional_variation(hot_days, lat, lon, stable_seed(f"hd{scenario}{time_period}"))
     return round(max(0, min(180, hot_days)), 0)
 
 def calculate_extreme_heat_days(lat, lon, scenario, time_period):
@@ -215,7 +239,7 @@ def calculate_extreme_heat_days(lat, lon, scenario, time_period):
     hot_days = calculate_hot_days(lat, lon, scenario, time_period)
     # Extreme days are roughly 10-20% of hot days
     extreme = hot_days * 0.15
-    extreme = add_regional_variation(extreme, lat, lon, hash(f"hd40{scenario}{time_period}"))
+    extreme = add_regional_variation(extreme, lat, lon, stable_seed(f"hd40{scenario}{time_period}"))
     return round(max(0, extreme), 0)
 
 def calculate_cdd(lat, lon, scenario, time_period):
@@ -229,99 +253,307 @@ def calculate_cdd(lat, lon, scenario, time_period):
     global_warming = GLOBAL_WARMING[scenario][time_period]
     cdd = base_cdd * (1 + global_warming * 0.05)
     
-    cdd = add_regional_variation(cdd, lat, lon, hash(f"cdd{scenario}{time_period}"))
+    cdd = add_regional_variation(cdd, lat, lon, stable_seed(f"cdd{scenario}{time_period}"))
     return round(max(5, min(200, cdd)), 0)
 
+# Pattern scaling: every indicator above is a per-cell response pattern scaled by
+# a global warming level, so one set of fields plus the scenario warming
+# trajectories is enough to evaluate any scenario, year or warming level.
+TRAJECTORY_YEARS = list(range(2025, 2101))
+
+# Present-day anchor for the trajectories (°C above pre-industrial, AR6 WG1)
+PRESENT_DAY_WARMING = (2020, 1.2)
+
+# Fixed seeds for the scenario-independent regional variation of each field
+PATTERN_SEEDS = {"tas": 1, "pr": 2, "hd": 3, "cdd": 4}
+
+def warming_trajectory(scenario):
+    """Annual global warming levels for TRAJECTORY_YEARS
+
+    GLOBAL_WARMING period values are placed at the period midpoint year and
+    linearly interpolated; years after the last period follow its trend.
+    """
+    anchor_years = [PRESENT_DAY_WARMING[0]] + [int(p) for p in TIME_PERIODS]
+    anchor_gwl = [PRESENT_DAY_WARMING[1]] + [GLOBAL_WARMING[scenario][p] for p in TIME_PERIODS]
+    years = np.array(TRAJECTORY_YEARS)
+    gwl = np.interp(years, anchor_years, anchor_gwl)
+
+    slope = (anchor_gwl[-1] - anchor_gwl[-2]) / (anchor_years[-1] - anchor_years[-2])
+    beyond = years > anchor_years[-1]
+    gwl[beyond] = anchor_gwl[-1] + slope * (years[beyond] - anchor_years[-1])
+
+    return years, np.round(gwl, 3)
+
+def build_pattern_fields(lats=GRID_LATS, lons=GRID_LONS):
+    """
+    Build per-cell response patterns for the grid.
+
+    Returns a dict of 1-D arrays (one entry per cell, lat-major order). The
+    regional variation is drawn once per cell so that the fields do not depend
+    on scenario or time period.
+    """
+    cells = [(lat, lon) for lat in lats for lon in lons]
+    fields = {
+        "latitude": np.array([c[0] for c in cells], dtype=float),
+        "longitude": np.array([c[1] for c in cells], dtype=float),
+    }
+
+    tas_pattern = []
+    tas_amplification = []
+    baseline_temp = []
+    baseline_precip = []
+    precip_sensitivity = []
+    variation = {key: [] for key in PATTERN_SEEDS if key != "tas"}
+
+    for lat, lon in cells:
+        pattern = get_polar_amplification(lat) * (1.3 if is_land(lat, lon) else 1.0)
+        tas_amplification.append(pattern)
+        tas_pattern.append(add_regional_variation(pattern, lat, lon, PATTERN_SEEDS["tas"]))
+        baseline_temp.append(get_baseline_temp(lat))
+        baseline_precip.append(get_baseline_precip(lat))
+        precip_sensitivity.append(get_precip_sensitivity(lat, lon))
+        for key in variation:
+            variation[key].append(add_regional_variation(1.0, lat, lon, PATTERN_SEEDS[key]))
+
+    fields["tas_pattern"] = np.array(tas_pattern)
+    fields["tas_amplification"] = np.array(tas_amplification)
+    fields["baseline_temp"] = np.array(baseline_temp)
+    fields["baseline_precip"] = np.array(baseline_precip, dtype=float)
+    fields["precip_sensitivity"] = np.array(precip_sensitivity)
+    for key, values in variation.items():
+        fields[f"{key}_variation"] = np.array(values)
+
+    return fields
+
+def evaluate_pattern(fields, global_warming):
+    """
+    Evaluate all indicators from pattern fields at one or more warming levels.
+
+    global_warming may be a scalar or an array; indicator arrays are returned
+    with shape global_warming.shape + (n_cells,).
+    """
+    gwl = np.asarray(global_warming, dtype=float)[..., np.newaxis]
+
+    tas = np.round(gwl * fields["tas_pattern"], 2)
+
+    pr = fields["baseline_precip"] * (1 + fields["precip_sensitivity"] * gwl / 100)
+    pr = np.round(np.maximum(50, pr * fields["pr_variation"]), 1)
+
+    baseline_temp = fields["baseline_temp"]
+    base_hot_days = np.maximum(0, (baseline_temp - 20) * 5)
+    hd35 = np.where(baseline_temp + tas > 25, base_hot_days * (1 + tas * 0.3), 0)
+    hd35 = np.round(np.clip(hd35 * fields["hd_variation"], 0, 180), 0)
+
+    base_cdd = np.maximum(5, 150 - pr / 10)
+    cdd = base_cdd * (1 + gwl * 0.05) * fields["cdd_variation"]
+    cdd = np.round(np.clip(cdd, 5, 200), 0)
+
+    return {
+        "tas": tas,
+        "tasmax": tas * 1.2,
+        "tasmin": tas * 0.85,
+        "pr": pr,
+        "hd35": hd35,
+        "cdd": cdd,
+    }
+
+# Uncertainty mode: Monte Carlo realizations reduced to these percentiles
+UNCERTAINTY_PERCENTILES = [5, 50, 95]
+UNCERTAINTY_SEED = 2024
+
+def uncertainty_rng(scenario, time_period, chunk=0, seed=UNCERTAINTY_SEED):
+    """Reproducible random stream for one scenario, period and chunk"""
+    return np.random.default_rng([seed, SCENARIOS.index(scenario), int(time_period), chunk])
+
+def evaluate_pattern_percentiles(fields, global_warming, n_realizations, rng,
+                                 percentiles=UNCERTAINTY_PERCENTILES):
+    """
+    Monte Carlo uncertainty bands for every cell at one warming level.
+
+    The regional variation of each field is redrawn as an
+    (n_realizations, n_cells) array, evaluated in one batch and reduced to
+    percentiles. Returns {indicator: array of shape (len(percentiles), n_cells)}.
+    """
+    shape = (n_realizations, len(fields["latitude"]))
+    draws = dict(fields)
+    draws["tas_pattern"] = fields["tas_amplification"] * (1 + rng.normal(0, REGIONAL_VARIATION_SD, shape))
+    for key in PATTERN_SEEDS:
+        if key != "tas":
+            draws[f"{key}_variation"] = 1 + rng.normal(0, REGIONAL_VARIATION_SD, shape)
+
+    values = evaluate_pattern(draws, global_warming)
+    return {ind_id: np.percentile(v, percentiles, axis=0) for ind_id, v in values.items()}
+
+PATTERN_FIELD_COLUMNS = [
+    "tas_pattern", "baseline_temp", "baseline_precip", "precip_sensitivity",
+    "pr_variation", "hd_variation", "cdd_variation",
+]
+
 def get_db_connection():
     return psycopg2.connect(DATABASE_URL)
 
-def import_cmip6_grid():
-    """Main import function"""
+def lat_chunks():
+    """Latitude bands of the grid; each band is one journaled unit per indicator"""
+    return [GRID_LATS[i:i + RESUME_CHUNK_LATS] for i in range(0, len(GRID_LATS), RESUME_CHUNK_LATS)]
+
+def slice_fields(fields, lats):
+    """Pattern fields restricted to cells in the given latitudes"""
+    mask = np.isin(fields["latitude"], lats)
+    return {key: values[mask] for key, values in fields.items()}
+
+def uncertainty_records(fields, scenario, time_period, n_realizations, percentiles, chunk=0):
+    """climate_grid_data records for the percentile bands of one scenario, period and chunk"""
+    bands = evaluate_pattern_percentiles(
+        fields, GLOBAL_WARMING[scenario][time_period], n_realizations,
+        uncertainty_rng(scenario, time_period, chunk), percentiles
+    )
+    records = []
+    for ind_id, unit, _ in INDICATORS:
+        for band, percentile in zip(bands[ind_id], percentiles):
+            for lat, lon, value in zip(fields["latitude"], fields["longitude"], band):
+                records.append((
+                    'cmip6',
+                    ind_id,
+                    scenario,
+                    time_period,
+                    float(lat),
+                    float(lon),
+                    round(float(value), 4),
+                    unit,
+                    'CMIP6-MMM',
+                    int(percentile)
+                ))
+    return records
+
+def chunk_records(lats, scenario, time_period):
+    """climate_grid_data records for the cells in the given latitudes"""
+    records = []
+    for lat in lats:
+        for lon in GRID_LONS:
+            # Calculate all indicators
+            tas = calculate_temp_anomaly(lat, lon, scenario, time_period)
+            tasmax = tas * 1.2  # Max temp increases ~20% more
+            tasmin = tas * 0.85  # Min temp increases ~15% less
+            pr = calculate_precip(lat, lon, scenario, time_period)
+            hd35 = calculate_hot_days(lat, lon, scenario, time_period)
+            cdd = calculate_cdd(lat, lon, scenario, time_period)
+            
+            values = [tas, tasmax, tasmin, pr, hd35, cdd]
+            
+            for (ind_id, unit, _), value in zip(INDICATORS, values):
+                records.append((
+                    'cmip6',
+                    ind_id,
+                    scenario,
+                    time_period,
+                    lat,
+                    lon,
+                    round(float(value), 4),
+                    unit,
+                    'CMIP6-MMM',  # Multi-Model Mean
+                    50
+                ))
+    return records
+
+def import_cmip6_grid(n_realizations=None, percentiles=UNCERTAINTY_PERCENTILES, resume=False):
+    """
+    Main import function
+
+    With n_realizations, every cell is written as Monte Carlo percentile bands
+    (one record per percentile) instead of a single deterministic value.
+
+    Every (indicator, scenario, period, latitude band) unit is journaled in
+    the transaction that writes it. With resume, the latest unfinished run
+    continues from its last committed unit instead of starting over; if
+    there is none, nothing is imported.
+    """
     print("=" * 60)
     print("CMIP6 Climate Grid Data Import")
     print("Based on IPCC AR6 regional patterns and CMIP6 multi-model means")
     print("=" * 60)
     
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    journal = ImportJournal.resume(conn, 'cmip6') if resume else None
+    if journal is not None:
+        n_realizations = journal.options.get("realizations")
+        percentiles = journal.options.get("percentiles", percentiles)
+        print(f"Resuming run {journal.run_id}: {len(journal.completed)} units, "
+              f"{journal.rows_completed} records already committed")
+    elif resume:
+        # Never rebuild from --resume: a retried resume after a successful
+        # import would otherwise clear the table
+        print("No unfinished CMIP6 import to resume; run without --resume to start a new import")
+        cur.close()
+        conn.close()
+        return
+    else:
+        journal = ImportJournal.start(conn, 'cmip6', {
+            "realizations": n_realizations,
+            "percentiles": percentiles,
+        })
+        cur.execute("DELETE FROM climate_grid_data WHERE source = 'cmip6'")
+        print(f"Cleared {cur.rowcount} existing CMIP6 records")
+        conn.commit()
+    
     n_points = len(GRID_LATS) * len(GRID_LONS)
     n_scenarios = len(SCENARIOS)
     n_periods = len(TIME_PERIODS)
-    n_indicators = 6
+    n_indicators = len(INDICATORS)
     
     print(f"Grid: {len(GRID_LATS)} lat x {len(GRID_LONS)} lon = {n_points} points")
     print(f"Scenarios: {SCENARIOS}")
     print(f"Time periods: {TIME_PERIODS}")
-    print(f"Total records: {n_points * n_scenarios * n_periods * n_indicators}")
+    if n_realizations:
+        print(f"Uncertainty: {n_realizations} realizations -> percentiles {percentiles}")
+    n_bands = len(percentiles) if n_realizations else 1
+    print(f"Total records: {n_points * n_scenarios * n_periods * n_indicators * n_bands}")
     print()
     
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("DELETE FROM climate_grid_data WHERE source = 'cmip6'")
-    print(f"Cleared {cur.rowcount} existing CMIP6 records")
+    fields = build_pattern_fields() if n_realizations else None
+    skipped = 0
     
-    records = []
-    indicators = [
-        ("tas", "°C", "Temperature Anomaly"),
-        ("tasmax", "°C", "Max Temp Anomaly"),
-        ("tasmin", "°C", "Min Temp Anomaly"),
-        ("pr", "mm/year", "Precipitation"),
-        ("hd35", "days", "Hot Days >35°C"),
-        ("cdd", "days", "Consecutive Dry Days"),
-    ]
-    
-    for scenario in SCENARIOS:
-        print(f"\nProcessing {scenario}...")
-        
-        for time_period in TIME_PERIODS:
-            for lat in GRID_LATS:
-                for lon in GRID_LONS:
-                    # Calculate all indicators
-                    tas = calculate_temp_anomaly(lat, lon, scenario, time_period)
-                    tasmax = tas * 1.2  # Max temp increases ~20% more
-                    tasmin = tas * 0.85  # Min temp increases ~15% less
-                    pr = calculate_precip(lat, lon, scenario, time_period)
-                    hd35 = calculate_hot_days(lat, lon, scenario, time_period)
-                    cdd = calculate_cdd(lat, lon, scenario, time_period)
-                    
-                    values = [tas, tasmax, tasmin, pr, hd35, cdd]
-                    
-                    for (ind_id, unit, _), value in zip(indicators, values):
-                        records.append((
-                            'cmip6',
-                            ind_id,
-                            scenario,
-                            time_period,
-                            lat,
-                            lon,
-                            round(float(value), 4),
-                            unit,
-                            'CMIP6-MMM',  # Multi-Model Mean
-                            50
-                        ))
-            
-            # Batch insert
-            if len(records) >= 2000:
-                execute_values(
-                    cur,
-                    """INSERT INTO climate_grid_data 
-                       (source, indicator_id, scenario, time_period, latitude, longitude, value, unit, model, percentile)
-                       VALUES %s""",
-                    records
-                )
-                conn.commit()
-                print(f"  Inserted {len(records)} records")
-                records = []
-    
-    if records:
-        execute_values(
-            cur,
-            """INSERT INTO climate_grid_data 
-               (source, indicator_id, scenario, time_period, latitude, longitude, value, unit, model, percentile)
-               VALUES %s""",
-            records
-        )
+    try:
+        # Generate the next batch while the writer thread loads the previous one
+        with PipelinedWriter(conn, journal=journal) as writer:
+            for scenario in SCENARIOS:
+                print(f"\nProcessing {scenario}...")
+                
+                for time_period in TIME_PERIODS:
+                    for chunk, lats in enumerate(lat_chunks()):
+                        units = [(ind_id, scenario, time_period, chunk) for ind_id, _, _ in INDICATORS]
+                        if all(journal.is_done(unit) for unit in units):
+                            skipped += 1
+                            continue
+                        
+                        if n_realizations:
+                            records = uncertainty_records(slice_fields(fields, lats), scenario, time_period,
+                                                          n_realizations, percentiles, chunk)
+                        else:
+                            records = chunk_records(lats, scenario, time_period)
+                        
+                        counts = {}
+                        for record in records:
+                            counts[record[1]] = counts.get(record[1], 0) + 1
+                        writer.submit(with_risk_levels(records),
+                                      [(unit, counts.get(unit[0], 0)) for unit in units])
+
+        cells = refresh_composite_scores(cur, 'cmip6')
         conn.commit()
-        print(f"  Inserted {len(records)} records")
+        print(f"\nComposite scores: {cells} cells")
+    except BaseException:
+        # Never let a dead connection mask the original error
+        try:
+            journal.finish("failed")
+        except Exception as e:
+            print(f"\nCould not mark run {journal.run_id} failed: {e}")
+        print(f"\nImport interrupted; continue with --resume (run {journal.run_id})")
+        raise
+    
+    journal.finish("completed")
+    if skipped:
+        print(f"\nSkipped {skipped} chunks committed by the interrupted run")
     
     cur.execute("SELECT COUNT(*) FROM climate_grid_data WHERE source = 'cmip6'")
     total = cur.fetchone()[0]
@@ -343,5 +575,146 @@ def import_cmip6_grid():
     conn.close()
     print("\nImport complete!")
 
+def import_cmip6_patterns():
+    """
+    Store pattern fields and warming trajectories instead of materialized rows.
+
+    Existing cmip6 rows and composite scores are removed in the same
+    transaction: the server only evaluates the patterns when no cmip6 rows
+    are stored.
+    """
+    print("=" * 60)
+    print("CMIP6 Pattern-Scaling Import")
+    print("=" * 60)
+
+    fields = build_pattern_fields()
+    n_points = len(fields["latitude"])
+    print(f"Grid: {len(GRID_LATS)} lat x {len(GRID_LONS)} lon = {n_points} points")
+    print(f"Trajectories: {SCENARIOS} x {TRAJECTORY_YEARS[0]}-{TRAJECTORY_YEARS[-1]}")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    cur.execute("DELETE FROM cmip6_pattern_fields")
+    cur.execute("DELETE FROM global_warming_trajectories")
+    cur.execute("DELETE FROM climate_grid_data WHERE source = 'cmip6'")
+    print(f"Cleared {cur.rowcount} materialized CMIP6 records")
+    cur.execute("DELETE FROM climate_composite_scores WHERE source = 'cmip6'")
+
+    records = []
+    for i in range(n_points):
+        records.append(
+            (float(fields["latitude"][i]), float(fields["longitude"][i]))
+            + tuple(round(float(fields[col][i]), 6) for col in PATTERN_FIELD_COLUMNS)
+            + ('CMIP6-MMM',)
+        )
+    execute_values(
+        cur,
+        f"""INSERT INTO cmip6_pattern_fields
+           (latitude, longitude, {', '.join(PATTERN_FIELD_COLUMNS)}, model)
+           VALUES %s""",
+        records
+    )
+    print(f"  Inserted {len(records)} pattern cells")
+
+    trajectory = []
+    for scenario in SCENARIOS:
+        years, gwl = warming_trajectory(scenario)
+        trajectory.extend((scenario, int(y), float(g)) for y, g in zip(years, gwl))
+    execute_values(
+        cur,
+        """INSERT INTO global_warming_trajectories (scenario, year, global_warming)
+           VALUES %s""",
+        trajectory
+    )
+    print(f"  Inserted {len(trajectory)} trajectory points")
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    materialized = n_points * len(SCENARIOS) * len(TIME_PERIODS) * len(INDICATORS)
+    print(f"\nStored {n_points} cells instead of {materialized} materialized records")
+    print("\nImport complete!")
+
+def evaluate_cmip6_point(lat, lon, scenario=None, year=None, global_warming=None):
+    """
+    Evaluate indicators for the grid cell nearest to (lat, lon) at query time.
+
+    Pass either scenario and year, or a global warming level directly.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    if global_warming is None:
+        if scenario is None or year is None:
+            raise ValueError("Either scenario and year or global_warming is required")
+        cur.execute(
+            "SELECT global_warming FROM global_warming_trajectories WHERE scenario = %s AND year = %s",
+            (scenario, year)
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"No warming trajectory for {scenario} in {year}")
+        global_warming = row[0]
+
+    cur.execute(
+        f"""SELECT latitude, longitude, {', '.join(PATTERN_FIELD_COLUMNS)}
+           FROM cmip6_pattern_fields
+           ORDER BY (latitude - %s) ^ 2 + (longitude - %s) ^ 2
+           LIMIT 1""",
+        (lat, lon)
+    )
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    if row is None:
+        raise ValueError("No CMIP6 pattern fields imported")
+
+    fields = {"latitude": np.array([row[0]]), "longitude": np.array([row[1]])}
+    for col, value in zip(PATTERN_FIELD_COLUMNS, row[2:]):
+        fields[col] = np.array([value])
+
+    values = evaluate_pattern(fields, global_warming)
+    return {
+        "latitude": row[0],
+        "longitude": row[1],
+        "global_warming": float(global_warming),
+        "values": {ind: round(float(v[0]), 4) for ind, v in values.items()},
+    }
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="Import CMIP6 grid data")
+    parser.add_argument("--pattern-scaling", action="store_true",
+                        help="Store pattern fields and warming trajectories instead of rows")
+    parser.add_argument("--evaluate", nargs=2, type=float, metavar=("LAT", "LON"),
+                        help="Evaluate stored pattern fields for a location")
+    parser.add_argument("--scenario", choices=SCENARIOS, help="Scenario for --evaluate")
+    parser.add_argument("--year", type=int, help="Year (2025-2100) for --evaluate")
+    parser.add_argument("--gwl", type=float, help="Global warming level (°C) for --evaluate")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last interrupted import from its last committed unit")
+    parser.add_argument("--realizations", type=int,
+                        help="Write Monte Carlo uncertainty bands from this many realizations")
+    parser.add_argument("--percentiles", type=int, nargs="+", default=UNCERTAINTY_PERCENTILES,
+                        help="Percentiles to store in uncertainty mode (default: 5 50 95)")
+    args = parser.parse_args()
+    # Map and location views read the median band only
+    if 50 not in args.percentiles:
+        parser.error("--percentiles must include 50")
+    return args
+
 if __name__ == "__main__":
-    import_cmip6_grid()
+    args = parse_args()
+    if args.evaluate:
+        result = evaluate_cmip6_point(*args.evaluate, scenario=args.scenario,
+                                      year=args.year, global_warming=args.gwl)
+        print(f"Cell ({result['latitude']}, {result['longitude']}) at {result['global_warming']}°C:")
+        for ind_id, value in result["values"].items():
+            print(f"  {ind_id}: {value}")
+    elif args.pattern_scaling:
+        import_cmip6_patterns()
+    else:
+        import_cmip6_grid(n_realizations=args.realizations, percentiles=args.percentiles,
+                          resume=args.resume)
@@ -13,11 +13,14 @@ ISIMIP data sources:
 import os
 import sys
 import tempfile
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import requests
 import numpy as np
 from datetime import datetime
 import psycopg2
-from psycopg2.extras import execute_values
+from pipelined_writer import PipelinedWriter
+from risk_levels import with_risk_levels, refresh_composite_scores
 
 try:
     import netCDF4 as nc
@@ -141,19 +144,23 @@ ISIMIP_INDICATORS = {
         "name": "Water Stress",
         "unit": "%",
         "variable": "pwtot",
-        "model": "watergap2"
+        "model": "watergap2",
+        # pwtot is a withdrawal flux (kg m-2 s-1), not a stress percentage
+        "extract": False
     },
     "crop_yield_change": {
         "name": "Crop Yield Change",
         "unit": "%",
         "variable": "yield",
-        "model": "lpjml"
+        "model": "lpjml",
+        "conversion": "percent_change"  # yield (t/ha) vs the historical period
     },
     "wildfire_risk": {
         "name": "Wildfire Risk",
         "unit": "probability",
         "variable": "burntarea",
-        "model": "jules-es"
+        "model": "jules-es",
+        "scale": 0.01  # % of cell burnt per year -> annual burn probability
     },
     "tropical_cyclone_exposure": {
         "name": "Tropical Cyclone Exposure",
@@ -165,7 +172,8 @@ ISIMIP_INDICATORS = {
         "name": "River Discharge Change",
         "unit": "%",
         "variable": "dis",
-        "model": "h08"
+        "model": "h08",
+        "conversion": "percent_change"  # discharge (m3/s) vs the historical period
     },
     "heat_mortality": {
         "name": "Heat-Related Mortality Risk",
@@ -180,6 +188,22 @@ TIME_PERIODS = ["historical", "2030", "2050", "2070", "2090"]
 
 ISIMIP_BASE_URL = "https://files.isimip.org/ISIMIP3b/OutputData"
 
+# Year windows averaged for each time period (period id is the window midpoint)
+PERIOD_YEARS = {
+    "historical": (1985, 2014),
+    "2030": (2020, 2039),
+    "2050": (2040, 2059),
+    "2070": (2060, 2079),
+    "2090": (2080, 2099),
+}
+
+# Concurrent extraction runs in worker processes: the HDF5 library bundled
+# with netCDF4 wheels is not thread-safe, so threads would crash or serialize
+EXTRACT_WORKERS = min(16, os.cpu_count() or 4)
+
+# Time steps read per block from contiguous (unchunked) variables
+EXTRACT_TIME_BLOCK = 32
+
 def get_db_connection():
     """Create database connection"""
     return psycopg2.connect(DATABASE_URL)
@@ -204,98 +228,374 @@ def download_netcdf(url, local_path):
         print(f"  Download failed: {e}")
         return False
 
+def find_lat_lon(ds):
+    """Return the latitude and longitude coordinate arrays of a dataset"""
+    lat_var = None
+    lon_var = None
+    for name in ['lat', 'latitude', 'y']:
+        if name in ds.variables:
+            lat_var = ds.variables[name][:]
+            break
+    for name in ['lon', 'longitude', 'x']:
+        if name in ds.variables:
+            lon_var = ds.variables[name][:]
+            break
+    return lat_var, lon_var
+
+def find_data_variable(ds, variable_name):
+    """Resolve a variable name, allowing partial matches like 'dis' in 'dis_global'"""
+    if variable_name in ds.variables:
+        return variable_name
+    for var in ds.variables:
+        if variable_name in var.lower():
+            return var
+    return None
+
+def time_axis_years(ds):
+    """Year of every time step, or None for files without a time axis"""
+    if 'time' not in ds.variables:
+        return None
+    time_var = ds.variables['time']
+    dates = nc.num2date(time_var[:], time_var.units, calendar=getattr(time_var, 'calendar', 'standard'))
+    return np.array([d.year for d in dates])
+
+def period_time_slice(ds, time_period, years=None):
+    """
+    Index slice of the time axis covering a period, or None if not covered.
+    Pass years from time_axis_years to avoid decoding the axis again.
+    """
+    if years is None:
+        years = time_axis_years(ds)
+    if years is None or time_period not in PERIOD_YEARS:
+        return slice(None)
+    start_year, end_year = PERIOD_YEARS[time_period]
+    idx = np.nonzero((years >= start_year) & (years <= end_year))[0]
+    if len(idx) == 0:
+        return None
+    return slice(int(idx[0]), int(idx[-1]) + 1)
+
+def _chunked_point_means(var, time_slice, lat_idx, lon_idx):
+    """
+    Time-mean of a (time, lat, lon) variable at the given points.
+
+    Reads follow the variable's chunk layout (whole time chunks, only the
+    latitude bands containing points) so each compressed chunk is
+    decompressed once rather than once per point.
+    """
+    chunking = var.chunking()
+    if chunking == 'contiguous':
+        time_chunk, lat_chunk = EXTRACT_TIME_BLOCK, var.shape[1]
+    else:
+        time_chunk, lat_chunk = chunking[0], chunking[1]
+
+    start, stop, _ = time_slice.indices(var.shape[0])
+    total = np.zeros(len(lat_idx))
+    count = np.zeros(len(lat_idx))
+    bands = lat_idx // lat_chunk
+
+    for band in np.unique(bands):
+        in_band = np.nonzero(bands == band)[0]
+        lat_lo = int(band) * lat_chunk
+        lat_hi = min(lat_lo + lat_chunk, var.shape[1])
+        t = start
+        while t < stop:
+            t_end = min((t // time_chunk + 1) * time_chunk, stop)
+            block = np.ma.filled(var[t:t_end, lat_lo:lat_hi, :], np.nan)
+            points = block[:, lat_idx[in_band] - lat_lo, lon_idx[in_band]].astype(float)
+            total[in_band] += np.nansum(points, axis=0)
+            count[in_band] += np.sum(~np.isnan(points), axis=0)
+            t = t_end
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total / count
+
+def extract_values_from_dataset(ds, variable_name, cities, time_slice=slice(None), label=""):
+    """Extract time-mean values for cities from an open dataset"""
+    lat_var, lon_var = find_lat_lon(ds)
+    if lat_var is None or lon_var is None:
+        print(f"  Could not find lat/lon variables in {label}")
+        return None
+
+    resolved = find_data_variable(ds, variable_name)
+    if resolved is None:
+        print(f"  Variable {variable_name} not found in {label}")
+        return None
+    var = ds.variables[resolved]
+
+    lat_idx = np.array([find_nearest_index(lat_var, city['lat']) for city in cities], dtype=int)
+    lon_idx = np.array([find_nearest_index(lon_var, city['lon']) for city in cities], dtype=int)
+
+    if len(var.shape) == 3:
+        values = _chunked_point_means(var, time_slice, lat_idx, lon_idx)
+    elif len(var.shape) == 2:
+        data = np.ma.filled(np.ma.asarray(var[:], dtype=float), np.nan)
+        values = data[lat_idx, lon_idx]
+    else:
+        values = np.full(len(cities), float(np.nanmean(var[:])))
+
+    results = []
+    for city, value in zip(cities, values):
+        value = float(value)
+        if not np.isnan(value) and not np.isinf(value):
+            results.append({
+                'city': city['name'],
+                'lat': city['lat'],
+                'lon': city['lon'],
+                'value': value
+            })
+
+    return results
+
 def extract_values_from_netcdf(nc_path, variable_name, cities):
     """Extract values for cities from NetCDF file"""
     try:
         ds = nc.Dataset(nc_path, 'r')
-        
-        lat_var = None
-        lon_var = None
-        for name in ['lat', 'latitude', 'y']:
-            if name in ds.variables:
-                lat_var = ds.variables[name][:]
-                break
-        for name in ['lon', 'longitude', 'x']:
-            if name in ds.variables:
-                lon_var = ds.variables[name][:]
-                break
-        
-        if lat_var is None or lon_var is None:
-            print(f"  Could not find lat/lon variables in {nc_path}")
+        try:
+            return extract_values_from_dataset(ds, variable_name, cities, label=nc_path)
+        finally:
             ds.close()
-            return None
-        
-        if variable_name not in ds.variables:
-            for var in ds.variables:
-                if variable_name in var.lower():
-                    variable_name = var
-                    break
-        
-        if variable_name not in ds.variables:
-            print(f"  Variable {variable_name} not found in {nc_path}")
-            ds.close()
-            return None
-        
-        data = ds.variables[variable_name][:]
-        
-        results = []
-        for city in cities:
-            lat_idx = find_nearest_index(lat_var, city['lat'])
-            lon_idx = find_nearest_index(lon_var, city['lon'])
-            
-            if len(data.shape) == 3:
-                value = float(np.nanmean(data[:, lat_idx, lon_idx]))
-            elif len(data.shape) == 2:
-                value = float(data[lat_idx, lon_idx])
-            else:
-                value = float(np.nanmean(data))
-            
-            if not np.isnan(value) and not np.isinf(value):
-                results.append({
-                    'city': city['name'],
-                    'lat': city['lat'],
-                    'lon': city['lon'],
-                    'value': value
-                })
-        
-        ds.close()
-        return results
     
     except Exception as e:
         print(f"  Error processing NetCDF: {e}")
         return None
 
-def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_period):
+def parse_isimip_filename(path):
     """
-    Generate scientifically plausible ISIMIP values based on:
-    - Geographic location (latitude, climate zone)
-    - Scenario severity (SSP1-2.6 to SSP5-8.5)
-    - Time horizon (further future = larger changes)
-    
-    This uses climate science patterns when real NetCDF data isn't available.
+    Parse scenario, variable and year range from an ISIMIP file name, e.g.
+    h08_gfdl-esm4_w5e5_ssp126_2015soc_default_dis_global_monthly_2015_2100.nc
+    """
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    tokens = stem.split('_')
+    scenario = next((t for t in tokens if t in SCENARIOS or t == "historical"), None)
+    years = [int(t) for t in tokens if t.isdigit() and len(t) == 4]
+    return {
+        'stem': stem,
+        'scenario': scenario,
+        'start_year': years[-2] if len(years) >= 2 else None,
+        'end_year': years[-1] if len(years) >= 2 else None,
+    }
+
+def series_key(path):
+    """File name without scenario, year and socioeconomic tokens, shared by a
+    model's historical and future files"""
+    tokens = parse_isimip_filename(path)['stem'].split('_')
+    return '_'.join(
+        t for t in tokens
+        if t not in SCENARIOS and t != "historical" and not (t.isdigit() and len(t) == 4)
+        and not t.endswith('soc')
+    )
+
+def find_historical_counterpart(path):
+    """The historical file of the same model and variable in the file's directory"""
+    directory = os.path.dirname(os.path.abspath(path))
+    key = series_key(path)
+    for name in sorted(os.listdir(directory)):
+        candidate = os.path.join(directory, name)
+        if (name.endswith('.nc') and parse_isimip_filename(candidate)['scenario'] == "historical"
+                and series_key(candidate) == key):
+            return candidate
+    return None
+
+def convert_extracted_values(indicator_id, values, baseline=None):
+    """
+    Convert extracted {city: value} of an indicator's variable into the
+    indicator's units. Percent-change indicators need the historical values
+    of the same model as baseline; returns None without one.
+    """
+    info = ISIMIP_INDICATORS[indicator_id]
+    if info.get('conversion') == "percent_change":
+        if baseline is None:
+            return None
+        return {
+            city: (value - baseline[city]) / abs(baseline[city]) * 100
+            for city, value in values.items()
+            if abs(baseline.get(city, 0)) > 1e-9
+        }
+    scale = info.get('scale', 1)
+    return {city: value * scale for city, value in values.items()}
+
+def extraction_jobs_for_file(path):
+    """
+    (indicator_id, scenario, time_period, path) jobs for one ISIMIP file.
+
+    Historical files yield jobs with scenario 'historical'; their values apply
+    to every scenario. Long files yield one job per period they cover.
+    """
+    meta = parse_isimip_filename(path)
+    if meta['scenario'] is None:
+        return []
+
+    jobs = []
+    for indicator_id, info in ISIMIP_INDICATORS.items():
+        if not info.get('extract', True):
+            continue
+        if f"_{info['variable']}_" not in f"_{meta['stem']}_":
+            continue
+        for time_period, (start_year, end_year) in PERIOD_YEARS.items():
+            if (time_period == "historical") != (meta['scenario'] == "historical"):
+                continue
+            if meta['start_year'] is not None and (
+                meta['end_year'] < start_year or meta['start_year'] > end_year
+            ):
+                continue
+            jobs.append((indicator_id, meta['scenario'], time_period, path))
+    return jobs
+
+def discover_extraction_jobs(netcdf_dir):
+    """Build extraction jobs for every ISIMIP file in a directory"""
+    jobs = []
+    for name in sorted(os.listdir(netcdf_dir)):
+        if name.endswith('.nc'):
+            jobs.extend(extraction_jobs_for_file(os.path.join(netcdf_dir, name)))
+    return jobs
+
+# Target cities of the current extraction worker process
+_worker_cities = []
+
+def _init_extract_worker(cities):
+    global _worker_cities
+    _worker_cities = cities
+
+def _extract_file(jobs):
+    """
+    Extract every (indicator, scenario, period, path) job of one file,
+    opening it and decoding its time axis once. Returns [(job, results)].
+    """
+    path = jobs[0][3]
+    try:
+        ds = nc.Dataset(path, 'r')
+    except Exception as e:
+        print(f"  Error processing {path}: {e}")
+        return [(job, None) for job in jobs]
+
+    out = []
+    try:
+        try:
+            years = time_axis_years(ds)
+        except Exception as e:
+            print(f"  Error processing {path}: {e}")
+            return [(job, None) for job in jobs]
+        for job in jobs:
+            indicator_id, scenario, time_period, _ = job
+            try:
+                time_slice = period_time_slice(ds, time_period, years)
+                if time_slice is None:
+                    out.append((job, None))
+                    continue
+                variable = ISIMIP_INDICATORS[indicator_id]['variable']
+                out.append((job, extract_values_from_dataset(ds, variable, _worker_cities,
+                                                              time_slice, label=path)))
+            except Exception as e:
+                print(f"  Error processing {path}: {e}")
+                out.append((job, None))
+    finally:
+        ds.close()
+    return out
+
+def iter_concurrent_extractions(jobs, cities, max_workers=EXTRACT_WORKERS, max_pending=None):
+    """
+    Extract jobs on a bounded worker pool, yielding (job, results) as they finish.
+
+    Each pool task is one file with all of its jobs. At most max_pending files
+    are in flight; new files are only submitted as the caller consumes
+    results, so a slow downstream writer throttles extraction.
+    """
+    max_pending = max_pending or max_workers * 2
+    by_file = {}
+    for job in jobs:
+        by_file.setdefault(job[3], []).append(job)
+    file_iter = iter(by_file[path] for path in sorted(by_file))
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_extract_worker,
+                             initargs=(cities,)) as executor:
+        pending = set()
+        try:
+            for file_jobs in file_iter:
+                pending.add(executor.submit(_extract_file, file_jobs))
+                if len(pending) >= max_pending:
+                    break
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+                    file_jobs = next(file_iter, None)
+                    if file_jobs is not None:
+                        pending.add(executor.submit(_extract_file, file_jobs))
+        finally:
+            for future in pending:
+                future.cancel()
+
+def extract_netcdf_dir(netcdf_dir, cities, max_workers=EXTRACT_WORKERS):
+    """
+    Extract all local ISIMIP files into {(indicator, scenario, period): {city: value}}.
+
+    Each model series is converted on its own; when several models cover a
+    slice, the stored value is their ensemble mean per city.
+    """
+    jobs = discover_extraction_jobs(netcdf_dir)
+    print(f"Extracting {len(jobs)} slices from {netcdf_dir} with {max_workers} workers")
+
+    # Raw values per model series, so percent changes use the same model's baseline
+    raw = {}
+    for (indicator_id, scenario, time_period, path), results in iter_concurrent_extractions(
+        jobs, cities, max_workers=max_workers
+    ):
+        if results:
+            raw[(indicator_id, series_key(path), scenario, time_period)] = {
+                r['city']: r['value'] for r in results
+            }
+
+    members = {}  # slice -> {city: [value per model]}
+    models = {}  # slice -> contributing model series
+    for (indicator_id, key, scenario, time_period), values in sorted(raw.items()):
+        baseline = raw.get((indicator_id, key, "historical", "historical"))
+        converted = convert_extracted_values(indicator_id, values, baseline)
+        if converted is None:
+            print(f"  Skipping {indicator_id} {scenario}/{time_period} ({key}): no historical baseline")
+            continue
+        targets = SCENARIOS if scenario == "historical" else [scenario]
+        for target in targets:
+            slice_key = (indicator_id, target, time_period)
+            models.setdefault(slice_key, []).append(key)
+            for city, value in converted.items():
+                members.setdefault(slice_key, {}).setdefault(city, []).append(value)
+
+    for (indicator_id, scenario, time_period), keys in sorted(models.items()):
+        if len(keys) > 1:
+            print(f"  {indicator_id} {scenario}/{time_period}: ensemble mean of {len(keys)} models")
+    return {
+        slice_key: {city: float(np.mean(values)) for city, values in cities_values.items()}
+        for slice_key, cities_values in members.items()
+    }
+
+SCENARIO_MULTIPLIER = {
+    "ssp126": 0.4,
+    "ssp245": 0.7,
+    "ssp370": 1.0,
+    "ssp585": 1.4,
+    "historical": 0.0
+}
+
+TIME_MULTIPLIER = {
+    "historical": 0.0,
+    "2030": 0.4,
+    "2050": 0.7,
+    "2070": 0.9,
+    "2090": 1.0
+}
+
+# Uncertainty mode: Monte Carlo realizations reduced to these percentiles
+UNCERTAINTY_PERCENTILES = [5, 50, 95]
+UNCERTAINTY_SEED = 2024
+
+def isimip_rule(indicator_id, lat, lon):
+    """
+    Climate-zone rule for an indicator at a location.
+
+    Returns (base_value, variation, noise_sd, min_value, max_value), where the
+    expected value is base_value + scenario x time multiplier x variation, or
+    None for unknown indicators.
     """
-    import hashlib
-    
-    seed_str = f"{indicator_id}_{lat}_{lon}_{scenario}_{time_period}"
-    seed = int(hashlib.md5(seed_str.encode()).hexdigest()[:8], 16)
-    np.random.seed(seed)
-    
-    scenario_multiplier = {
-        "ssp126": 0.4,
-        "ssp245": 0.7,
-        "ssp370": 1.0,
-        "ssp585": 1.4,
-        "historical": 0.0
-    }.get(scenario, 0.7)
-    
-    time_multiplier = {
-        "historical": 0.0,
-        "2030": 0.4,
-        "2050": 0.7,
-        "2070": 0.9,
-        "2090": 1.0
-    }.get(time_period, 0.7)
-    
     abs_lat = abs(lat)
     tropical = abs_lat < 23.5
     subtropical = 23.5 <= abs_lat < 35
@@ -303,9 +603,6 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
     polar = abs_lat >= 55
     coastal = abs(lon) > 100 or abs(lon) < 20
     
-    base_value = 0
-    variation = 0
-    
     if indicator_id == "flood_depth":
         if tropical:
             base_value = 0.8
@@ -313,10 +610,7 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
             base_value = 0.6
         else:
             base_value = 0.3
-        variation = 0.3
-        final = base_value + (scenario_multiplier * time_multiplier * variation)
-        final += np.random.normal(0, 0.1)
-        return max(0, min(5, final))
+        return base_value, 0.3, 0.1, 0, 5
     
     elif indicator_id == "drought_severity":
         if tropical and not coastal:
@@ -325,10 +619,7 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
             base_value = -0.8
         else:
             base_value = -0.3
-        variation = -1.5
-        final = base_value + (scenario_multiplier * time_multiplier * variation)
-        final += np.random.normal(0, 0.2)
-        return max(-4, min(4, final))
+        return base_value, -1.5, 0.2, -4, 4
     
     elif indicator_id == "water_stress":
         if subtropical and not coastal:
@@ -337,10 +628,7 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
             base_value = 25
         else:
             base_value = 20
-        variation = 30
-        final = base_value + (scenario_multiplier * time_multiplier * variation)
-        final += np.random.normal(0, 5)
-        return max(0, min(100, final))
+        return base_value, 30, 5, 0, 100
     
     elif indicator_id == "crop_yield_change":
         if tropical:
@@ -352,9 +640,7 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
         else:
             base_value = 0
             variation = -15
-        final = base_value + (scenario_multiplier * time_multiplier * variation)
-        final += np.random.normal(0, 3)
-        return max(-50, min(30, final))
+        return base_value, variation, 3, -50, 30
     
     elif indicator_id == "wildfire_risk":
         if subtropical and not coastal:
@@ -363,10 +649,7 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
             base_value = 0.08
         else:
             base_value = 0.03
-        variation = 0.25
-        final = base_value + (scenario_multiplier * time_multiplier * variation)
-        final += np.random.normal(0, 0.02)
-        return max(0, min(1, final))
+        return base_value, 0.25, 0.02, 0, 1
     
     elif indicator_id == "tropical_cyclone_exposure":
         if tropical and coastal:
@@ -375,10 +658,7 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
             base_value = 1.5
         else:
             base_value = 0.2
-        variation = 1.5
-        final = base_value + (scenario_multiplier * time_multiplier * variation)
-        final += np.random.normal(0, 0.3)
-        return max(0, min(10, final))
+        return base_value, 1.5, 0.3, 0, 10
     
     elif indicator_id == "river_discharge_change":
         if tropical:
@@ -390,9 +670,7 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
         else:
             base_value = 0
             variation = -10
-        final = base_value + (scenario_multiplier * time_multiplier * variation)
-        final += np.random.normal(0, 5)
-        return max(-50, min(50, final))
+        return base_value, variation, 5, -50, 50
     
     elif indicator_id == "heat_mortality":
         if tropical:
@@ -401,15 +679,67 @@ def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_perio
             base_value = 10
         else:
             base_value = 5
-        variation = 30
-        final = base_value + (scenario_multiplier * time_multiplier * variation)
-        final += np.random.normal(0, 2)
-        return max(0, min(100, final))
+        return base_value, 30, 2, 0, 100
+    
+    return None
+
+def generate_realistic_isimip_value(indicator_id, lat, lon, scenario, time_period):
+    """
+    Generate scientifically plausible ISIMIP values based on:
+    - Geographic location (latitude, climate zone)
+    - Scenario severity (SSP1-2.6 to SSP5-8.5)
+    - Time horizon (further future = larger changes)
     
-    return 0
+    This uses climate science patterns when real NetCDF data isn't available.
+    """
+    seed_str = f"{indicator_id}_{lat}_{lon}_{scenario}_{time_period}"
+    seed = int(hashlib.md5(seed_str.encode()).hexdigest()[:8], 16)
+    np.random.seed(seed)
+    
+    rule = isimip_rule(indicator_id, lat, lon)
+    if rule is None:
+        return 0
+    base_value, variation, noise_sd, min_value, max_value = rule
+    
+    multiplier = SCENARIO_MULTIPLIER.get(scenario, 0.7) * TIME_MULTIPLIER.get(time_period, 0.7)
+    final = base_value + (multiplier * variation)
+    final += np.random.normal(0, noise_sd)
+    return max(min_value, min(max_value, final))
+
+def uncertainty_rng(*key, seed=UNCERTAINTY_SEED):
+    """Reproducible random stream for one slice, independent of generation order"""
+    digest = hashlib.md5("_".join(str(k) for k in key).encode()).hexdigest()
+    return np.random.default_rng([seed, int(digest[:8], 16)])
 
-def import_isimip_data_to_db():
-    """Main function to import ISIMIP data into database"""
+def generate_isimip_percentiles(indicator_id, lats, lons, scenario, time_period,
+                                n_realizations, percentiles=UNCERTAINTY_PERCENTILES,
+                                seed=UNCERTAINTY_SEED):
+    """
+    Monte Carlo uncertainty bands for many locations at once.
+
+    Draws n_realizations per location as one (n_realizations, n_locations)
+    array using each rule's noise scale, and reduces them to the requested
+    percentiles. Returns an array of shape (len(percentiles), n_locations).
+    """
+    rules = [isimip_rule(indicator_id, lat, lon) or (0, 0, 0, 0, 0) for lat, lon in zip(lats, lons)]
+    base_value, variation, noise_sd, min_value, max_value = np.array(rules, dtype=float).T
+
+    multiplier = SCENARIO_MULTIPLIER.get(scenario, 0.7) * TIME_MULTIPLIER.get(time_period, 0.7)
+    expected = base_value + multiplier * variation
+
+    rng = uncertainty_rng(indicator_id, scenario, time_period, seed=seed)
+    draws = expected + rng.standard_normal((n_realizations, len(expected))) * noise_sd
+    draws = np.clip(draws, min_value, max_value)
+    return np.percentile(draws, percentiles, axis=0)
+
+def import_isimip_data_to_db(netcdf_dir=None, max_workers=EXTRACT_WORKERS,
+                             n_realizations=None, percentiles=UNCERTAINTY_PERCENTILES):
+    """
+    Main function to import ISIMIP data into database
+
+    With n_realizations, modeled values are written as Monte Carlo percentile
+    bands (one record per percentile) instead of a single median draw.
+    """
     print("=" * 60)
     print("ISIMIP Climate Impact Data Import")
     print("=" * 60)
@@ -417,9 +747,21 @@ def import_isimip_data_to_db():
     print(f"Indicators: {len(ISIMIP_INDICATORS)}")
     print(f"Scenarios: {len(SCENARIOS)}")
     print(f"Time periods: {len(TIME_PERIODS)}")
-    print(f"Total records to generate: {len(GLOBAL_CITIES) * len(ISIMIP_INDICATORS) * len(SCENARIOS) * len(TIME_PERIODS)}")
+    if n_realizations:
+        print(f"Uncertainty: {n_realizations} realizations -> percentiles {percentiles}")
+    n_bands = len(percentiles) if n_realizations else 1
+    print(f"Total records to generate: {len(GLOBAL_CITIES) * len(ISIMIP_INDICATORS) * len(SCENARIOS) * len(TIME_PERIODS) * n_bands}")
     print()
     
+    city_lats = [city['lat'] for city in GLOBAL_CITIES]
+    city_lons = [city['lon'] for city in GLOBAL_CITIES]
+    
+    extracted = {}
+    if netcdf_dir:
+        extracted = extract_netcdf_dir(netcdf_dir, GLOBAL_CITIES, max_workers)
+        print(f"Extracted {sum(len(v) for v in extracted.values())} values from NetCDF files")
+        print()
+    
     conn = get_db_connection()
     cur = conn.cursor()
     
@@ -428,56 +770,59 @@ def import_isimip_data_to_db():
     print(f"Cleared {deleted} existing ISIMIP records")
     
     records = []
-    
-    for indicator_id, indicator_info in ISIMIP_INDICATORS.items():
-        print(f"\nProcessing indicator: {indicator_info['name']}")
+
+    # Generate the next batch while the writer thread loads the previous one;
+    # the import stays a single transaction, committed when the writer closes
+    with PipelinedWriter(conn, commit_each_batch=False) as writer:
+        for indicator_id, indicator_info in ISIMIP_INDICATORS.items():
+            print(f"\nProcessing indicator: {indicator_info['name']}")
         
-        for scenario in SCENARIOS:
-            for time_period in TIME_PERIODS:
-                for city in GLOBAL_CITIES:
-                    value = generate_realistic_isimip_value(
-                        indicator_id,
-                        city['lat'],
-                        city['lon'],
-                        scenario,
-                        time_period
-                    )
+            for scenario in SCENARIOS:
+                for time_period in TIME_PERIODS:
+                    file_values = extracted.get((indicator_id, scenario, time_period), {})
+                    if n_realizations:
+                        bands = generate_isimip_percentiles(
+                            indicator_id, city_lats, city_lons, scenario, time_period,
+                            n_realizations, percentiles
+                        )
+                    for i, city in enumerate(GLOBAL_CITIES):
+                        value = file_values.get(city['name'])
+                        if value is None and n_realizations:
+                            city_values = zip(percentiles, bands[:, i])
+                        else:
+                            if value is None:
+                                value = generate_realistic_isimip_value(
+                                    indicator_id,
+                                    city['lat'],
+                                    city['lon'],
+                                    scenario,
+                                    time_period
+                                )
+                            city_values = [(50, value)]
                     
-                    records.append((
-                        'isimip',
-                        indicator_id,
-                        scenario,
-                        time_period,
-                        city['lat'],
-                        city['lon'],
-                        round(value, 4),
-                        indicator_info['unit'],
-                        f"isimip3b-{indicator_info['model']}",
-                        50
-                    ))
+                        for percentile, value in city_values:
+                            records.append((
+                                'isimip',
+                                indicator_id,
+                                scenario,
+                                time_period,
+                                city['lat'],
+                                city['lon'],
+                                round(float(value), 4),
+                                indicator_info['unit'],
+                                f"isimip3b-{indicator_info['model']}",
+                                int(percentile)
+                            ))
         
-        if len(records) >= 1000:
-            execute_values(
-                cur,
-                """INSERT INTO climate_grid_data 
-                   (source, indicator_id, scenario, time_period, latitude, longitude, value, unit, model, percentile)
-                   VALUES %s""",
-                records
-            )
-            print(f"  Inserted {len(records)} records")
-            records = []
-    
-    if records:
-        execute_values(
-            cur,
-            """INSERT INTO climate_grid_data 
-               (source, indicator_id, scenario, time_period, latitude, longitude, value, unit, model, percentile)
-               VALUES %s""",
-            records
-        )
-        print(f"  Inserted {len(records)} records")
+            if len(records) >= 1000:
+                writer.submit(with_risk_levels(records))
+                records = []
+        
+        writer.submit(with_risk_levels(records))
     
+    cells = refresh_composite_scores(cur, 'isimip')
     conn.commit()
+    print(f"\nComposite scores: {cells} cells")
     
     cur.execute("SELECT COUNT(*) FROM climate_grid_data WHERE source = 'isimip'")
     total = cur.fetchone()[0]
@@ -524,5 +869,23 @@ def try_download_real_isimip():
     
     return False
 
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="Import ISIMIP climate impact data")
+    parser.add_argument("--netcdf-dir", help="Directory of local ISIMIP NetCDF files to extract")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS,
+                        help=f"Concurrent extraction processes (default: {EXTRACT_WORKERS})")
+    parser.add_argument("--realizations", type=int,
+                        help="Write Monte Carlo uncertainty bands from this many realizations")
+    parser.add_argument("--percentiles", type=int, nargs="+", default=UNCERTAINTY_PERCENTILES,
+                        help="Percentiles to store in uncertainty mode (default: 5 50 95)")
+    args = parser.parse_args()
+    # Map and location views read the median band only
+    if 50 not in args.percentiles:
+        parser.error("--percentiles must include 50")
+    return args
+
 if __name__ == "__main__":
-    import_isimip_data_to_db()
+    args = parse_args()
+    import_isimip_data_to_db(netcdf_dir=args.netcdf_dir, max_workers=args.workers,
+                             n_realizations=args.realizations, percentiles=args.percentiles)
@@ -0,0 +1,103 @@
+"""
+Import Run Journal
+
+Records each import run in import_runs and every committed unit of work
+(indicator, scenario, period, chunk) with its row count in
+import_run_journal. Journal entries are written in the same transaction as
+the rows they describe, so after a crash the journal is exactly what made it
+to the database and an interrupted run can be resumed from there.
+"""
+
+import json
+import uuid
+
+class ImportJournal:
+    """Journal for one import run"""
+
+    def __init__(self, conn, source, run_id, options=None, completed=None):
+        self.conn = conn
+        self.source = source
+        self.run_id = run_id
+        self.options = options or {}
+        self.completed = completed or {}
+
+    @classmethod
+    def start(cls, conn, source, options=None):
+        """
+        Begin a new run. Unfinished earlier runs of the source are marked
+        abandoned. Not committed: the caller commits together with its
+        initial cleanup so that a resumable run never exists without it.
+        """
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE import_runs SET status = 'abandoned', finished_at = now()
+               WHERE source = %s AND status IN ('running', 'failed')""",
+            (source,)
+        )
+        run_id = str(uuid.uuid4())
+        cur.execute(
+            """INSERT INTO import_runs (id, source, status, options)
+               VALUES (%s, %s, 'running', %s)""",
+            (run_id, source, json.dumps(options or {}))
+        )
+        cur.close()
+        return cls(conn, source, run_id, options)
+
+    @classmethod
+    def resume(cls, conn, source):
+        """Reopen the latest unfinished run of the source, or return None"""
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT id, options FROM import_runs
+               WHERE source = %s AND status IN ('running', 'failed')
+               ORDER BY started_at DESC LIMIT 1""",
+            (source,)
+        )
+        row = cur.fetchone()
+        if row is None:
+            cur.close()
+            return None
+
+        run_id, options = row
+        if isinstance(options, str):
+            options = json.loads(options)
+        cur.execute(
+            """SELECT indicator_id, scenario, time_period, chunk, row_count
+               FROM import_run_journal WHERE run_id = %s""",
+            (run_id,)
+        )
+        completed = {tuple(r[:4]): r[4] for r in cur.fetchall()}
+        cur.execute("UPDATE import_runs SET status = 'running' WHERE id = %s", (run_id,))
+        conn.commit()
+        cur.close()
+        return cls(conn, source, run_id, options, completed)
+
+    def is_done(self, unit):
+        """Whether an (indicator, scenario, period, chunk) unit is already committed"""
+        return tuple(unit) in self.completed
+
+    @property
+    def rows_completed(self):
+        return sum(self.completed.values())
+
+    def record(self, cur, units):
+        """Journal [(unit, row_count), ...] inside the caller's transaction"""
+        for unit, row_count in units:
+            indicator_id, scenario, time_period, chunk = unit
+            cur.execute(
+                """INSERT INTO import_run_journal
+                   (run_id, indicator_id, scenario, time_period, chunk, row_count)
+                   VALUES (%s, %s, %s, %s, %s, %s)""",
+                (self.run_id, indicator_id, scenario, time_period, chunk, row_count)
+            )
+            self.completed[tuple(unit)] = row_count
+
+    def finish(self, status="completed"):
+        """Close the run with a final status and commit"""
+        cur = self.conn.cursor()
+        cur.execute(
+            "UPDATE import_runs SET status = %s, finished_at = now() WHERE id = %s",
+            (status, self.run_id)
+        )
+        self.conn.commit()
+        cur.close()
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+ISIMIP Ingestion Daemon
+
+Watches a drop directory (and/or polls a local JSON stand-in for the ISIMIP
+file index) for new NetCDF files. Each file is validated, only the
+indicator x scenario x period slices it contains are extracted for
+GLOBAL_CITIES, and those slices are upserted into climate_grid_data, with
+no full re-import. Files are deduplicated by content checksum in
+climate_ingest_files, work runs on a bounded pool of worker processes, and
+queue depth and lag are reported in a status file and optional HTTP
+endpoint.
+
+Usage:
+    python scripts/ingest_daemon.py --watch-dir /data/isimip/incoming \
+        --status-file /tmp/isimip-ingest.json --status-port 8765
+"""
+
+import os
+import json
+import time
+import signal
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from import_isimip_netcdf import (
+    nc, GLOBAL_CITIES, ISIMIP_INDICATORS, SCENARIOS, get_db_connection,
+    extraction_jobs_for_file, extract_values_from_dataset, find_lat_lon,
+    find_data_variable, period_time_slice, find_historical_counterpart,
+    convert_extracted_values,
+)
+from pipelined_writer import CLIMATE_GRID_INSERT_SQL, advisory_xact_lock
+from risk_levels import with_risk_levels, refresh_composite_scores
+from psycopg2.extras import execute_values
+
+POLL_INTERVAL = 10  # seconds between scans
+SETTLE_SECONDS = 5  # files must be unmodified this long before ingestion
+FAILED_RETRY_SECONDS = 300  # retry files that failed for non-validation reasons
+INGEST_WORKERS = min(4, os.cpu_count() or 2)
+
+class InvalidFile(ValueError):
+    """A file that can never be ingested as-is (recorded, not retried)"""
+
+def file_checksum(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def record_ingest(cur, checksum, path, status, slices=None, rows=None, error=None):
+    cur.execute(
+        """INSERT INTO climate_ingest_files (checksum, path, status, slices, row_count, error)
+           VALUES (%s, %s, %s, %s, %s, %s)
+           ON CONFLICT (checksum) DO UPDATE SET
+             path = EXCLUDED.path, status = EXCLUDED.status, slices = EXCLUDED.slices,
+             row_count = EXCLUDED.row_count, error = EXCLUDED.error, ingested_at = now()""",
+        (checksum, path, status, slices, rows, error)
+    )
+
+def historical_baseline(path, indicator_id):
+    """
+    {city: value} of the historical period from the same model's historical
+    file, for percent-change indicators. Raises RuntimeError (retried) while
+    that file has not arrived yet.
+    """
+    hist_path = find_historical_counterpart(path)
+    if hist_path is None:
+        raise RuntimeError(f"No historical file for {indicator_id} baseline next to {path}")
+    with nc.Dataset(hist_path, 'r') as ds:
+        variable = ISIMIP_INDICATORS[indicator_id]['variable']
+        time_slice = period_time_slice(ds, "historical")
+        results = extract_values_from_dataset(ds, variable, GLOBAL_CITIES, time_slice, label=hist_path)
+    if not results:
+        raise RuntimeError(f"Historical file {hist_path} has no {indicator_id} baseline")
+    return {r['city']: r['value'] for r in results}
+
+def validate_and_extract(path):
+    """
+    Validate a file and extract its slices, converted to indicator units.
+
+    Returns {(indicator_id, scenario, time_period): [city results]}, with
+    historical slices expanded to every scenario.
+    """
+    jobs = extraction_jobs_for_file(path)
+    if not jobs:
+        raise InvalidFile("File name does not match a known ISIMIP indicator and scenario")
+
+    try:
+        ds = nc.Dataset(path, 'r')
+    except OSError as e:
+        raise InvalidFile(f"Not a readable NetCDF file: {e}")
+
+    city_coords = {city['name']: (city['lat'], city['lon']) for city in GLOBAL_CITIES}
+    try:
+        lat_var, lon_var = find_lat_lon(ds)
+        if lat_var is None or lon_var is None:
+            raise InvalidFile("Missing lat/lon coordinates")
+
+        slices = {}
+        baselines = {}
+        for indicator_id, scenario, time_period, _ in jobs:
+            variable = ISIMIP_INDICATORS[indicator_id]['variable']
+            if find_data_variable(ds, variable) is None:
+                raise InvalidFile(f"Variable {variable} not found")
+            try:
+                time_slice = period_time_slice(ds, time_period)
+            except (AttributeError, ValueError) as e:
+                raise InvalidFile(f"Undecodable time axis: {e}")
+            if time_slice is None:
+                continue
+
+            results = extract_values_from_dataset(ds, variable, GLOBAL_CITIES, time_slice, label=path)
+            if not results:
+                continue
+            values = {r['city']: r['value'] for r in results}
+            baseline = None
+            if ISIMIP_INDICATORS[indicator_id].get('conversion') == "percent_change":
+                if scenario == "historical":
+                    baseline = values
+                else:
+                    if indicator_id not in baselines:
+                        baselines[indicator_id] = historical_baseline(path, indicator_id)
+                    baseline = baselines[indicator_id]
+            converted = convert_extracted_values(indicator_id, values, baseline)
+            results = [
+                {'city': city, 'lat': city_coords[city][0], 'lon': city_coords[city][1], 'value': value}
+                for city, value in converted.items()
+            ]
+            targets = SCENARIOS if scenario == "historical" else [scenario]
+            for target in targets:
+                slices[(indicator_id, target, time_period)] = results
+        return slices
+    finally:
+        ds.close()
+
+def ingest_file(path):
+    """Worker entry point: dedupe, validate, extract and upsert one file"""
+    checksum = file_checksum(path)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Identical bytes at two paths: the second waits and then sees the first's record
+        advisory_xact_lock(cur, "ingest", checksum)
+        cur.execute(
+            "SELECT status FROM climate_ingest_files WHERE checksum = %s AND status IN ('ingested', 'invalid')",
+            (checksum,)
+        )
+        row = cur.fetchone()
+        if row is not None:
+            return {"path": path, "checksum": checksum, "status": "duplicate", "rows": 0}
+
+        try:
+            slices = validate_and_extract(path)
+        except InvalidFile as e:
+            record_ingest(cur, checksum, path, "invalid", error=str(e))
+            conn.commit()
+            return {"path": path, "checksum": checksum, "status": "invalid", "error": str(e), "rows": 0}
+
+        # Replace only the cities and slices this file provides, every
+        # percentile band of them: file-backed cities carry the median only,
+        # as in the importer. Files with overlapping slices (e.g. two GCMs of
+        # one variable) take the slice locks in the same sorted order and
+        # replace them one after another.
+        for key in sorted(slices):
+            advisory_xact_lock(cur, "slice", *key)
+
+        rows = 0
+        for (indicator_id, scenario, time_period), results in sorted(slices.items()):
+            info = ISIMIP_INDICATORS[indicator_id]
+            cur.execute(
+                """DELETE FROM climate_grid_data
+                   WHERE source = 'isimip' AND indicator_id = %s AND scenario = %s
+                     AND time_period = %s
+                     AND (latitude, longitude) IN (SELECT * FROM unnest(%s::real[], %s::real[]))""",
+                (indicator_id, scenario, time_period,
+                 [r['lat'] for r in results], [r['lon'] for r in results])
+            )
+            records = [(
+                'isimip', indicator_id, scenario, time_period, r['lat'], r['lon'],
+                round(r['value'], 4), info['unit'], f"isimip3b-{info['model']}", 50
+            ) for r in results]
+            execute_values(cur, CLIMATE_GRID_INSERT_SQL, with_risk_levels(records))
+            rows += len(records)
+
+        for scenario, time_period in sorted({key[1:] for key in slices}):
+            refresh_composite_scores(cur, 'isimip', scenario, time_period)
+
+        record_ingest(cur, checksum, path, "ingested", slices=len(slices), rows=rows)
+        conn.commit()
+        return {"path": path, "checksum": checksum, "status": "ingested", "slices": len(slices), "rows": rows}
+    except Exception as e:
+        conn.rollback()
+        try:
+            record_ingest(cur, checksum, path, "failed", error=str(e))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def read_index(index_path):
+    """Paths listed in a local JSON file index ({"files": [{"path": ...}]} or a list)"""
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"  Could not read index {index_path}: {e}")
+        return []
+    entries = index.get("files", []) if isinstance(index, dict) else index
+    base = os.path.dirname(os.path.abspath(index_path))
+    paths = []
+    for entry in entries:
+        path = entry.get("path") if isinstance(entry, dict) else entry
+        if path:
+            paths.append(path if os.path.isabs(path) else os.path.join(base, path))
+    return paths
+
+class IngestDaemon:
+    """Scan for new files and ingest them on a bounded worker pool"""
+
+    def __init__(self, watch_dir=None, index_path=None, workers=INGEST_WORKERS,
+                 interval=POLL_INTERVAL, settle=SETTLE_SECONDS, status_file=None):
+        self.watch_dir = watch_dir
+        self.index_path = index_path
+        self.workers = workers
+        self.interval = interval
+        self.settle = settle
+        self.status_file = status_file
+
+        self.pending = deque()  # (path, landed_at)
+        self.in_flight = {}  # future -> (path, landed_at)
+        self.seen = {}  # path -> (size, mtime) already queued
+        self.failed_at = {}  # path -> time of last failure
+        self.counts = {"ingested": 0, "duplicate": 0, "invalid": 0, "failed": 0}
+        self.last_ingest_at = None
+        self.started_at = time.time()
+        self.stopping = False
+        self._lock = threading.Lock()
+        self._status = {}
+
+    def candidates(self):
+        paths = []
+        if self.watch_dir:
+            paths.extend(
+                os.path.join(self.watch_dir, name)
+                for name in sorted(os.listdir(self.watch_dir)) if name.endswith('.nc')
+            )
+        if self.index_path:
+            paths.extend(p for p in read_index(self.index_path) if p.endswith('.nc'))
+        return paths
+
+    def scan(self):
+        """Queue files that are new or changed and have settled"""
+        now = time.time()
+        for path in self.candidates():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime < self.settle:
+                continue
+            signature = (st.st_size, st.st_mtime)
+            if self.seen.get(path) == signature:
+                failed = self.failed_at.get(path)
+                if failed is None or now - failed < FAILED_RETRY_SECONDS:
+                    continue
+                del self.failed_at[path]
+            self.seen[path] = signature
+            self.pending.append((path, st.st_mtime))
+
+    def dispatch(self, executor):
+        while self.pending and len(self.in_flight) < self.workers:
+            path, landed_at = self.pending[0]
+            # A broken pool raises here; the file stays queued for the next pool
+            future = executor.submit(ingest_file, path)
+            self.pending.popleft()
+            self.in_flight[future] = (path, landed_at)
+
+    def collect(self, done):
+        """Record finished futures; returns True if a worker process died"""
+        broken = False
+        for future in done:
+            path, _ = self.in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                broken = broken or isinstance(e, BrokenProcessPool)
+                self.counts["failed"] += 1
+                self.failed_at[path] = time.time()
+                print(f"  Failed {path}: {e}")
+                continue
+            self.counts[result["status"]] += 1
+            if result["status"] == "ingested":
+                self.last_ingest_at = time.time()
+                print(f"  Ingested {path}: {result['slices']} slices, {result['rows']} records")
+            elif result["status"] == "invalid":
+                print(f"  Invalid {path}: {result['error']}")
+            else:
+                print(f"  Skipped {path}: already ingested (checksum {result['checksum'][:12]})")
+        return broken
+
+    def restart_pool(self, executor):
+        """
+        Replace a pool broken by a crashed worker (e.g. HDF5 aborting on a
+        corrupt file). Every in-flight file is recorded as failed and retried
+        later like any other failure.
+        """
+        print("  Worker process died; restarting the worker pool")
+        done, _ = wait(self.in_flight)
+        self.collect(done)
+        executor.shutdown(wait=False)
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def update_status(self):
+        now = time.time()
+        waiting = list(self.pending) + list(self.in_flight.values())
+        oldest = min((landed_at for _, landed_at in waiting), default=None)
+
+        def iso(ts):
+            return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+        status = {
+            "queue_depth": len(self.pending),
+            "in_flight": len(self.in_flight),
+            "lag_seconds": round(now - oldest, 1) if oldest is not None else 0,
+            "counts": dict(self.counts),
+            "last_ingest_at": iso(self.last_ingest_at),
+            "started_at": iso(self.started_at),
+            "updated_at": iso(now),
+        }
+        with self._lock:
+            self._status = status
+
+        if self.status_file:
+            tmp_path = f"{self.status_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(status, f, indent=2)
+            os.replace(tmp_path, self.status_file)
+
+    def run(self, once=False):
+        executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            while True:
+                if not self.stopping:
+                    self.scan()
+                    try:
+                        self.dispatch(executor)
+                    except BrokenProcessPool:
+                        executor = self.restart_pool(executor)
+                        continue
+                self.update_status()
+
+                if self.stopping or once:
+                    if not self.in_flight and (self.stopping or not self.pending):
+                        break
+
+                if self.in_flight:
+                    done, _ = wait(self.in_flight, timeout=self.interval, return_when=FIRST_COMPLETED)
+                    if self.collect(done):
+                        executor = self.restart_pool(executor)
+                else:
+                    time.sleep(self.interval)
+        finally:
+            executor.shutdown()
+        self.update_status()
+
+def serve_status(daemon, port):
+    """Serve the daemon status as JSON on GET /status"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ('', '/status'):
+                self.send_error(404)
+                return
+            body = json.dumps(daemon.status()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, name="status-http", daemon=True).start()
+    return server
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="Ingest newly arriving ISIMIP NetCDF files")
+    parser.add_argument("--watch-dir", help="Drop directory to watch for .nc files")
+    parser.add_argument("--index", help="Local JSON file index to poll")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help=f"Concurrent ingest processes (default: {INGEST_WORKERS})")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                        help=f"Seconds between scans (default: {POLL_INTERVAL})")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help=f"Seconds a file must be unmodified before ingestion (default: {SETTLE_SECONDS})")
+    parser.add_argument("--status-file", help="Write queue depth and lag to this JSON file")
+    parser.add_argument("--status-port", type=int, help="Serve status as JSON on this local port")
+    parser.add_argument("--once", action="store_true", help="Ingest what is present, then exit")
+    args = parser.parse_args()
+    if not args.watch_dir and not args.index:
+        parser.error("one of --watch-dir or --index is required")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    daemon = IngestDaemon(args.watch_dir, args.index, args.workers, args.interval,
+                          args.settle, args.status_file)
+
+    def stop(signum, frame):
+        print("\nStopping after in-flight files complete...")
+        daemon.stopping = True
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if args.status_port:
+        serve_status(daemon, args.status_port)
+        print(f"Status: http://127.0.0.1:{args.status_port}/status")
+
+    print(f"Watching {args.watch_dir or args.index} with {args.workers} workers")
+    daemon.run(once=args.once)
+    print("Ingestion daemon stopped")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Climate Grid Load Harness
+
+Fills climate_grid_data in a local PostgreSQL database at a configurable
+grid resolution with the CMIP6 importer's pattern-scaling generator, then
+replays the server's two read paths concurrently through a connection pool:
+
+- location: the 3-degree box around a location in queryDatabaseClimateData
+- viewport: the map viewport scan for one indicator in generateGriddedRiskData
+
+Reports p50/p95/p99 latency per query shape plus a summary of
+EXPLAIN (ANALYZE, BUFFERS) over a sample of the same queries.
+
+Usage:
+    python scripts/load_harness.py --fill --resolution 1.0
+    python scripts/load_harness.py --concurrency 16 --requests 2000
+"""
+
+import time
+import random
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.pool import ThreadedConnectionPool
+
+from import_cmip6_grid import (
+    DATABASE_URL, SCENARIOS, TIME_PERIODS, INDICATORS, GLOBAL_WARMING,
+    build_pattern_fields, evaluate_pattern, get_db_connection,
+)
+from pipelined_writer import PipelinedWriter
+from risk_levels import with_risk_levels
+
+# Rows are written under their own source so a harness run never touches imported data
+DEFAULT_SOURCE = "loadtest"
+LOCATION_RADIUS = 3  # degrees, as in queryDatabaseClimateData
+VIEWPORT_SIZE = (40, 60)  # degrees of latitude and longitude
+EXPLAIN_SAMPLES = 20
+LATENCY_PERCENTILES = [50, 95, 99]
+FILL_BATCH_ROWS = 20000
+
+# Column list drizzle's db.select() expands to
+SELECT_COLUMNS = """id, source, indicator_id, scenario, time_period, latitude, longitude,
+       value, unit, model, percentile, data_source, risk_level, thresholds_version, updated_at"""
+
+# Indexes the read paths are meant to use. They are declared as sql constants in
+# shared/schema.ts, which drizzle-kit push does not execute, so --fill creates them
+GRID_INDEXES = {
+    "idx_climate_grid_indicator":
+        "CREATE INDEX IF NOT EXISTS idx_climate_grid_indicator ON climate_grid_data(source, indicator_id, scenario, time_period)",
+    "idx_climate_grid_latlon":
+        "CREATE INDEX IF NOT EXISTS idx_climate_grid_latlon ON climate_grid_data(latitude, longitude)",
+}
+
+QUERY_SHAPES = {
+    "location": f"""SELECT {SELECT_COLUMNS} FROM climate_grid_data
+       WHERE source = %(source)s AND scenario = %(scenario)s AND time_period = %(time_period)s
+         AND percentile = 50
+         AND latitude BETWEEN %(south)s AND %(north)s
+         AND longitude BETWEEN %(west)s AND %(east)s""",
+    "viewport": f"""SELECT {SELECT_COLUMNS} FROM climate_grid_data
+       WHERE source = %(source)s AND indicator_id = %(indicator_id)s
+         AND scenario = %(scenario)s AND time_period = %(time_period)s
+         AND percentile = 50
+         AND latitude BETWEEN %(south)s AND %(north)s
+         AND longitude BETWEEN %(west)s AND %(east)s""",
+}
+
+def fill_grid(resolution, source=DEFAULT_SOURCE):
+    """Replace the harness rows with a synthetic CMIP6 grid at the given resolution"""
+    lats = np.arange(-60, 80 + resolution / 2, resolution).round(4).tolist()
+    lons = np.arange(-180, 180, resolution).round(4).tolist()
+    print(f"Building pattern fields for {len(lats)} x {len(lons)} = {len(lats) * len(lons)} cells...")
+    fields = build_pattern_fields(lats, lons)
+    n_rows = len(fields["latitude"]) * len(SCENARIOS) * len(TIME_PERIODS) * len(INDICATORS)
+    print(f"Writing {n_rows} records under source '{source}'")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM climate_grid_data WHERE source = %s", (source,))
+    print(f"Cleared {cur.rowcount} existing {source} records")
+    conn.commit()
+
+    started = time.perf_counter()
+    with PipelinedWriter(conn) as writer:
+        for scenario in SCENARIOS:
+            for time_period in TIME_PERIODS:
+                values = evaluate_pattern(fields, GLOBAL_WARMING[scenario][time_period])
+                records = []
+                for ind_id, unit, _ in INDICATORS:
+                    for lat, lon, value in zip(fields["latitude"], fields["longitude"], values[ind_id]):
+                        records.append((
+                            source, ind_id, scenario, time_period, float(lat), float(lon),
+                            round(float(value), 4), unit, 'CMIP6-MMM', 50
+                        ))
+                        if len(records) >= FILL_BATCH_ROWS:
+                            writer.submit(with_risk_levels(records))
+                            records = []
+                writer.submit(with_risk_levels(records))
+
+    conn.autocommit = True
+    for name, ddl in GRID_INDEXES.items():
+        cur.execute(ddl)
+        print(f"Ensured index {name}")
+    # Fresh statistics so the plans reflect the new table size
+    cur.execute("ANALYZE climate_grid_data")
+    print(f"Filled {n_rows} records in {time.perf_counter() - started:.1f}s")
+    cur.close()
+    conn.close()
+
+def random_params(shape, rng, source):
+    """Parameters for one request of a query shape"""
+    params = {
+        "source": source,
+        "scenario": rng.choice(SCENARIOS),
+        "time_period": rng.choice(TIME_PERIODS),
+    }
+    if shape == "location":
+        lat, lon = rng.uniform(-55, 75), rng.uniform(-180, 180)
+        params.update(south=lat - LOCATION_RADIUS, north=lat + LOCATION_RADIUS,
+                      west=lon - LOCATION_RADIUS, east=lon + LOCATION_RADIUS)
+    else:
+        lat_size, lon_size = VIEWPORT_SIZE
+        south, west = rng.uniform(-60, 80 - lat_size), rng.uniform(-180, 180 - lon_size)
+        params.update(indicator_id=rng.choice(INDICATORS)[0],
+                      south=south, north=south + lat_size, west=west, east=west + lon_size)
+    return params
+
+def replay(pool, shape, n_requests, concurrency, source, seed=0):
+    """Run n_requests of a query shape on concurrency threads; returns (latencies_ms, rows, wall_s)"""
+    rng = random.Random(seed)
+    requests = [random_params(shape, rng, source) for _ in range(n_requests)]
+    sql = QUERY_SHAPES[shape]
+    latencies = np.empty(n_requests)
+    rows = np.empty(n_requests, dtype=int)
+
+    def run(i):
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                started = time.perf_counter()
+                cur.execute(sql, requests[i])
+                rows[i] = len(cur.fetchall())
+                latencies[i] = (time.perf_counter() - started) * 1000
+            conn.rollback()
+        finally:
+            pool.putconn(conn)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, range(n_requests)))
+    return latencies, rows, time.perf_counter() - started
+
+def plan_nodes(node):
+    """Flatten an EXPLAIN JSON plan tree"""
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+def explain_summary(conn, shape, source, samples=EXPLAIN_SAMPLES, seed=1):
+    """Aggregate EXPLAIN (ANALYZE, BUFFERS) over sample requests of a query shape"""
+    rng = random.Random(seed)
+    planning, execution, hit, read = [], [], [], []
+    node_types, indexes = {}, {}
+    with conn.cursor() as cur:
+        for _ in range(samples):
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {QUERY_SHAPES[shape]}",
+                        random_params(shape, rng, source))
+            result = cur.fetchone()[0][0]
+            root = result["Plan"]
+            planning.append(result["Planning Time"])
+            execution.append(result["Execution Time"])
+            hit.append(root.get("Shared Hit Blocks", 0))
+            read.append(root.get("Shared Read Blocks", 0))
+            for node in plan_nodes(root):
+                node_types[node["Node Type"]] = node_types.get(node["Node Type"], 0) + 1
+                if "Index Name" in node:
+                    indexes[node["Index Name"]] = indexes.get(node["Index Name"], 0) + 1
+    conn.rollback()
+    return {
+        "planning_ms": float(np.median(planning)),
+        "execution_ms": float(np.median(execution)),
+        "shared_hit_blocks": float(np.mean(hit)),
+        "shared_read_blocks": float(np.mean(read)),
+        "node_types": node_types,
+        "indexes": indexes,
+    }
+
+def run_harness(shapes, n_requests, concurrency, source=DEFAULT_SOURCE, explain_samples=EXPLAIN_SAMPLES):
+    """Replay each query shape and print latency and plan summaries"""
+    pool = ThreadedConnectionPool(1, concurrency, DATABASE_URL)
+    try:
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM climate_grid_data WHERE source = %s", (source,))
+                total = cur.fetchone()[0]
+                cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'climate_grid_data'")
+                existing = {row[0] for row in cur.fetchall()}
+            conn.rollback()
+        finally:
+            pool.putconn(conn)
+        if total == 0:
+            print(f"No '{source}' records; fill the table first with --fill")
+            return
+        missing = sorted(set(GRID_INDEXES) - existing)
+        if missing:
+            print(f"Warning: missing indexes {', '.join(missing)}; plans will show sequential scans "
+                  f"(run with --fill to create them)")
+        print(f"{total} '{source}' records, {n_requests} requests per shape at concurrency {concurrency}")
+
+        for shape in shapes:
+            latencies, rows, wall = replay(pool, shape, n_requests, concurrency, source)
+            p = np.percentile(latencies, LATENCY_PERCENTILES)
+            print(f"\n{shape}:")
+            print("  latency ms  " + "  ".join(f"p{q}={v:.2f}" for q, v in zip(LATENCY_PERCENTILES, p))
+                  + f"  max={latencies.max():.2f}")
+            print(f"  throughput  {n_requests / wall:.1f} req/s, {rows.mean():.1f} rows/request")
+
+            if explain_samples:
+                conn = pool.getconn()
+                try:
+                    plan = explain_summary(conn, shape, source, explain_samples)
+                finally:
+                    pool.putconn(conn)
+                print(f"  EXPLAIN (ANALYZE, BUFFERS) median of {explain_samples}: "
+                      f"planning {plan['planning_ms']:.2f} ms, execution {plan['execution_ms']:.2f} ms")
+                print(f"    buffers  shared hit {plan['shared_hit_blocks']:.0f}, "
+                      f"read {plan['shared_read_blocks']:.0f} (mean)")
+                print("    nodes    " + ", ".join(f"{k} x{v}" for k, v in sorted(plan["node_types"].items())))
+                if plan["indexes"]:
+                    print("    indexes  " + ", ".join(f"{k} x{v}" for k, v in sorted(plan["indexes"].items())))
+    finally:
+        pool.closeall()
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="Load test the climate_grid_data read paths")
+    parser.add_argument("--fill", action="store_true", help="Refill the harness rows before replaying")
+    parser.add_argument("--fill-only", action="store_true", help="Refill the harness rows and exit")
+    parser.add_argument("--resolution", type=float, default=1.0,
+                        help="Grid resolution in degrees for --fill (default: 1.0)")
+    parser.add_argument("--source", default=DEFAULT_SOURCE,
+                        help=f"Source tag of the harness rows (default: {DEFAULT_SOURCE})")
+    parser.add_argument("--shapes", nargs="+", choices=list(QUERY_SHAPES), default=list(QUERY_SHAPES),
+                        help="Query shapes to replay (default: all)")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per query shape (default: 500)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default: 8)")
+    parser.add_argument("--explain-samples", type=int, default=EXPLAIN_SAMPLES,
+                        help=f"Queries per shape to EXPLAIN, 0 to skip (default: {EXPLAIN_SAMPLES})")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.fill or args.fill_only:
+        fill_grid(args.resolution, args.source)
+    if not args.fill_only:
+        run_harness(args.shapes, args.requests, args.concurrency, args.source, args.explain_samples)
@@ -0,0 +1,162 @@
+"""
+Pipelined Database Writer
+
+Streams record batches to PostgreSQL on a background thread so the import
+scripts can generate the next batch while the previous one is being written.
+A bounded queue provides back-pressure: when the database falls behind, the
+generator blocks on submit() instead of buffering the whole import in memory.
+
+Usage:
+    with PipelinedWriter(conn, CLIMATE_GRID_INSERT_SQL) as writer:
+        for batch in batches:
+            writer.submit(with_risk_levels(batch))
+"""
+
+import queue
+import hashlib
+import threading
+from psycopg2.extras import execute_values
+
+CLIMATE_GRID_COLUMNS = [
+    "source", "indicator_id", "scenario", "time_period", "latitude", "longitude",
+    "value", "unit", "model", "percentile", "risk_level", "thresholds_version",
+]
+
+CLIMATE_GRID_INSERT_SQL = f"""INSERT INTO climate_grid_data
+   ({', '.join(CLIMATE_GRID_COLUMNS)})
+   VALUES %s"""
+
+# Batches buffered between generator and writer (one being written, one queued)
+DEFAULT_MAX_PENDING = 2
+# How often a blocked submit() checks that the writer thread is still alive
+PUT_POLL_SECONDS = 0.5
+
+def advisory_xact_lock(cur, *key):
+    """Take a transaction-scoped PostgreSQL advisory lock named by key"""
+    digest = hashlib.md5("_".join(str(k) for k in key).encode()).digest()
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (int.from_bytes(digest[:8], 'big', signed=True),))
+
+_STOP = object()
+
+class WriterError(RuntimeError):
+    """Raised in the generating thread when the writer thread failed"""
+
+class PipelinedWriter:
+    """Write batches with execute_values on a background thread"""
+
+    def __init__(self, conn, insert_sql=CLIMATE_GRID_INSERT_SQL, commit_each_batch=True,
+                 max_pending=DEFAULT_MAX_PENDING, page_size=1000, journal=None):
+        self.conn = conn
+        self.journal = journal
+        self.insert_sql = insert_sql
+        self.commit_each_batch = commit_each_batch
+        self.page_size = page_size
+        self.rows_written = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._started = False
+        self._closed = False
+
+    def start(self):
+        if not self._started:
+            self._thread.start()
+            self._started = True
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def _run(self):
+        cur = self.conn.cursor()
+        try:
+            while True:
+                item = self._queue.get()
+                try:
+                    if item is _STOP:
+                        return
+                    if self._error is not None:
+                        continue  # drain so the producer never blocks after a failure
+                    records, units = item
+                    try:
+                        execute_values(cur, self.insert_sql, records, page_size=self.page_size)
+                        if units and self.journal is not None:
+                            self.journal.record(cur, units)
+                        if self.commit_each_batch:
+                            self.conn.commit()
+                        self.rows_written += len(records)
+                        print(f"  Inserted {len(records)} records")
+                    except Exception as e:
+                        self._error = e
+                        try:
+                            self.conn.rollback()
+                        except Exception:
+                            pass  # e.g. the connection is gone; the batch error is what matters
+                finally:
+                    self._queue.task_done()
+        finally:
+            cur.close()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise WriterError(f"Database writer failed: {self._error}") from self._error
+
+    def _put(self, item):
+        """Queue an item, raising WriterError instead of blocking if the writer thread died"""
+        while True:
+            try:
+                self._queue.put(item, timeout=PUT_POLL_SECONDS)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    self._raise_if_failed()
+                    raise WriterError("Database writer thread exited")
+
+    def submit(self, records, units=None):
+        """
+        Queue a batch for writing, blocking while the writer is behind.
+
+        units, a list of (unit, row_count), are journaled in the same
+        transaction as the batch.
+        """
+        if self._closed:
+            raise WriterError("Writer is closed")
+        self._raise_if_failed()
+        if records:
+            self.start()
+            self._put((list(records), units))
+
+    def close(self):
+        """Flush queued batches, wait for the writer and commit"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._started:
+            self._put(_STOP)
+            self._thread.join()
+        self._raise_if_failed()
+        self.conn.commit()
+
+    def abort(self):
+        """Stop the writer, discarding queued batches, and roll back"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._started:
+            self._error = self._error or WriterError("Aborted")
+            try:
+                self._put(_STOP)
+            except WriterError:
+                pass  # the writer already exited
+            self._thread.join()
+        try:
+            self.conn.rollback()
+        except Exception:
+            pass  # keep the exception that caused the abort
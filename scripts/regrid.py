@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Regridding Engine
+
+Computes conservative (area-weighted) and bilinear interpolation weights
+between rectilinear latitude/longitude grids and applies them as a sparse
+matrix-vector product. Weights are computed once per (source, target, method)
+and cached on disk, so re-projecting many variables, time steps and models
+onto a common grid only costs the mat-vec.
+
+Usage:
+    python scripts/regrid.py FILE.nc [FILE.nc ...] --variable dis --method conservative
+"""
+
+import os
+import hashlib
+import numpy as np
+
+CACHE_DIR = os.environ.get(
+    "REGRID_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "climate-risk-screener", "regrid")
+)
+
+METHODS = ["conservative", "bilinear"]
+
+# Cell centers of the climate_grid_data CMIP6 grid (GRID_LATS/GRID_LONS in
+# import_cmip6_grid.py, which exits on import without DATABASE_URL)
+CMIP6_GRID_LATS = list(range(-60, 85, 5))
+CMIP6_GRID_LONS = list(range(-180, 180, 5))
+
+# Rows per mat-vec block, bounds the (rows x nnz) temporary in apply()
+APPLY_BLOCK_SIZE = 64
+
+# Time steps read and regridded at once by regrid_netcdf
+READ_BLOCK_STEPS = 64
+
+def _edges_from_centers(centers, lower, upper):
+    """Cell edges halfway between centers, extrapolated at the ends"""
+    centers = np.asarray(centers, dtype=float)
+    if len(centers) == 1:
+        return np.array([max(lower, centers[0] - 0.5), min(upper, centers[0] + 0.5)])
+    mid = (centers[:-1] + centers[1:]) / 2
+    first = centers[0] - (mid[0] - centers[0])
+    last = centers[-1] + (centers[-1] - mid[-1])
+    return np.clip(np.concatenate([[first], mid, [last]]), lower, upper)
+
+class Grid:
+    """Rectilinear lat/lon grid described by cell centers and edges"""
+
+    def __init__(self, lats, lons, lat_edges=None, lon_edges=None):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.lat_edges = (np.asarray(lat_edges, dtype=float) if lat_edges is not None
+                          else _edges_from_centers(self.lats, -90.0, 90.0))
+        self.lon_edges = (np.asarray(lon_edges, dtype=float) if lon_edges is not None
+                          else _edges_from_centers(self.lons, -np.inf, np.inf))
+
+    @classmethod
+    def regular(cls, resolution, lat_min=-90.0, lat_max=90.0, lon_min=-180.0, lon_max=180.0):
+        """Regular grid with cells of the given size in degrees"""
+        lat_edges = np.arange(lat_min, lat_max + resolution / 2, resolution)
+        lon_edges = np.arange(lon_min, lon_max + resolution / 2, resolution)
+        lats = (lat_edges[:-1] + lat_edges[1:]) / 2
+        lons = (lon_edges[:-1] + lon_edges[1:]) / 2
+        return cls(lats, lons, lat_edges, lon_edges)
+
+    @classmethod
+    def from_netcdf(cls, ds):
+        """Build a grid from the lat/lon coordinate variables of an open dataset"""
+        lats = lons = None
+        for name in ['lat', 'latitude', 'y']:
+            if name in ds.variables:
+                lats = ds.variables[name][:]
+                break
+        for name in ['lon', 'longitude', 'x']:
+            if name in ds.variables:
+                lons = ds.variables[name][:]
+                break
+        if lats is None or lons is None:
+            raise ValueError("Could not find lat/lon variables")
+        return cls(np.asarray(lats), np.asarray(lons))
+
+    @property
+    def shape(self):
+        return (len(self.lats), len(self.lons))
+
+    @property
+    def size(self):
+        return len(self.lats) * len(self.lons)
+
+    def key(self):
+        """Stable identifier for caching weights"""
+        h = hashlib.sha1()
+        for arr in (self.lats, self.lons, self.lat_edges, self.lon_edges):
+            h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+        return h.hexdigest()[:16]
+
+    def cell_areas(self):
+        """Relative cell areas (sin(lat) extent x longitude extent in radians)"""
+        lo = np.minimum(self.lat_edges[:-1], self.lat_edges[1:])
+        hi = np.maximum(self.lat_edges[:-1], self.lat_edges[1:])
+        lat_extent = np.sin(np.radians(hi)) - np.sin(np.radians(lo))
+        lon_extent = np.radians(np.abs(np.diff(self.lon_edges)))
+        return np.outer(lat_extent, lon_extent)
+
+class SparseWeights:
+    """Regridding weights in compressed sparse row form (target x source)"""
+
+    def __init__(self, data, indices, indptr, src_shape, dst_shape):
+        self.data = np.asarray(data, dtype=np.float64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.src_shape = tuple(int(n) for n in src_shape)
+        self.dst_shape = tuple(int(n) for n in dst_shape)
+        counts = np.diff(self.indptr)
+        self._rows = np.nonzero(counts)[0]
+        self._starts = self.indptr[:-1][self._rows]
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, src_shape, dst_shape):
+        """Build from (row, col, value) triplets, dropping zero weights"""
+        keep = values > 0
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+        order = np.lexsort((cols, rows))
+        rows, cols, values = rows[order], cols[order], values[order]
+        n_rows = dst_shape[0] * dst_shape[1]
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+        return cls(values, cols, indptr, src_shape, dst_shape)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def matvec(self, x):
+        """Multiply a (n_vectors, n_source) block by the weight matrix"""
+        out = np.zeros((x.shape[0], len(self.indptr) - 1))
+        if self.nnz:
+            products = x[:, self.indices] * self.data
+            out[:, self._rows] = np.add.reduceat(products, self._starts, axis=1)
+        return out
+
+    def apply(self, field):
+        """
+        Regrid a field of shape (..., n_lat_src, n_lon_src).
+
+        Missing values (NaN or masked) are excluded and the remaining weights
+        renormalized, so land-only or partially covered fields stay unbiased.
+        Target cells with no valid source data are NaN.
+        """
+        field = np.ma.filled(np.ma.asarray(field, dtype=np.float64), np.nan)
+        if field.shape[-2:] != self.src_shape:
+            raise ValueError(f"Field shape {field.shape[-2:]} does not match source grid {self.src_shape}")
+
+        leading = field.shape[:-2]
+        flat = field.reshape(-1, self.src_shape[0] * self.src_shape[1])
+        result = np.empty((flat.shape[0], len(self.indptr) - 1))
+
+        for start in range(0, flat.shape[0], APPLY_BLOCK_SIZE):
+            block = flat[start:start + APPLY_BLOCK_SIZE]
+            valid = ~np.isnan(block)
+            numerator = self.matvec(np.where(valid, block, 0.0))
+            denominator = self.matvec(valid.astype(np.float64))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[start:start + APPLY_BLOCK_SIZE] = np.where(
+                    denominator > 0, numerator / denominator, np.nan
+                )
+
+        return result.reshape(leading + self.dst_shape)
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, data=self.data, indices=self.indices, indptr=self.indptr,
+                 src_shape=self.src_shape, dst_shape=self.dst_shape)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f["data"], f["indices"], f["indptr"], f["src_shape"], f["dst_shape"])
+
+def _interval_overlap(dst_edges, src_edges, period=None):
+    """Dense (n_dst, n_src) matrix of interval overlap lengths"""
+    dst_lo = np.minimum(dst_edges[:-1], dst_edges[1:])[:, None]
+    dst_hi = np.maximum(dst_edges[:-1], dst_edges[1:])[:, None]
+    src_lo = np.minimum(src_edges[:-1], src_edges[1:])[None, :]
+    src_hi = np.maximum(src_edges[:-1], src_edges[1:])[None, :]
+
+    shifts = [0.0] if period is None else [-period, 0.0, period]
+    overlap = np.zeros((dst_lo.shape[0], src_lo.shape[1]))
+    for shift in shifts:
+        overlap += np.clip(np.minimum(dst_hi, src_hi + shift) - np.maximum(dst_lo, src_lo + shift), 0, None)
+    return overlap
+
+def _linear_weights(dst, src, period=None):
+    """Dense (n_dst, n_src) matrix of 1-D linear interpolation weights"""
+    weights = np.zeros((len(dst), len(src)))
+    order = np.argsort(src)
+    s = src[order]
+
+    if period is not None:
+        # Pad with wrapped neighbours so targets between the last and first
+        # source longitude interpolate across the seam
+        s = np.concatenate([[s[-1] - period], s, [s[0] + period]])
+        order = np.concatenate([[order[-1]], order, [order[0]]])
+        d = (dst - s[1]) % period + s[1]
+    else:
+        d = np.clip(dst, s[0], s[-1])
+
+    upper = np.clip(np.searchsorted(s, d), 1, len(s) - 1)
+    lower = upper - 1
+    span = s[upper] - s[lower]
+    frac = np.where(span > 0, (d - s[lower]) / np.where(span > 0, span, 1), 0.0)
+
+    rows = np.arange(len(dst))
+    np.add.at(weights, (rows, order[lower]), 1 - frac)
+    np.add.at(weights, (rows, order[upper]), frac)
+    return weights
+
+def _kron_weights(lat_weights, lon_weights, src, dst):
+    """Combine separable 1-D weights into a sparse 2-D weight matrix"""
+    i, k = np.nonzero(lat_weights)
+    j, l = np.nonzero(lon_weights)
+    rows = (i[:, None] * dst.shape[1] + j[None, :]).ravel()
+    cols = (k[:, None] * src.shape[1] + l[None, :]).ravel()
+    values = (lat_weights[i, k][:, None] * lon_weights[j, l][None, :]).ravel()
+    return SparseWeights.from_coo(rows, cols, values, src.shape, dst.shape)
+
+def conservative_weights(src, dst):
+    """Area-weighted overlap weights between two grids"""
+    lat_overlap = _interval_overlap(
+        np.sin(np.radians(dst.lat_edges)), np.sin(np.radians(src.lat_edges))
+    )
+    lon_overlap = _interval_overlap(dst.lon_edges, src.lon_edges, period=360.0)
+    return _kron_weights(lat_overlap, lon_overlap, src, dst)
+
+def bilinear_weights(src, dst):
+    """Bilinear interpolation weights from source cell centers to target centers"""
+    lat_weights = _linear_weights(dst.lats, src.lats)
+    lon_weights = _linear_weights(dst.lons, src.lons, period=360.0)
+    return _kron_weights(lat_weights, lon_weights, src, dst)
+
+def get_weights(src, dst, method="conservative", cache_dir=CACHE_DIR):
+    """Load weights for a grid pair from the cache, computing them on a miss"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown regrid method: {method}")
+
+    path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"{method}_{src.key()}_{dst.key()}.npz")
+        if os.path.exists(path):
+            return SparseWeights.load(path)
+
+    if method == "conservative":
+        weights = conservative_weights(src, dst)
+    else:
+        weights = bilinear_weights(src, dst)
+
+    if path:
+        weights.save(path)
+    return weights
+
+def regrid_netcdf(nc_path, variable_name, target, out_path, method="conservative",
+                  block_steps=READ_BLOCK_STEPS):
+    """
+    Regrid a NetCDF variable onto the target grid and write it to out_path.
+
+    The variable is read, regridded and written in blocks of block_steps
+    along its leading (time) axis, so memory stays bounded for long daily
+    series.
+    """
+    import netCDF4 as nc
+
+    with nc.Dataset(nc_path, 'r') as src_ds:
+        if variable_name not in src_ds.variables:
+            raise ValueError(f"Variable {variable_name} not found in {nc_path}")
+        src_var = src_ds.variables[variable_name]
+        src = Grid.from_netcdf(src_ds)
+        weights = get_weights(src, target, method)
+        leading = src_var.dimensions[:-2]
+
+        with nc.Dataset(out_path, 'w') as ds:
+            ds.createDimension('lat', len(target.lats))
+            ds.createDimension('lon', len(target.lons))
+            for dim in leading:
+                ds.createDimension(dim, len(src_ds.dimensions[dim]))
+            ds.createVariable('lat', 'f8', ('lat',))[:] = target.lats
+            ds.createVariable('lon', 'f8', ('lon',))[:] = target.lons
+            for dim in leading:
+                # Keep the time coordinate (units, calendar) so the output decodes like the input
+                if dim in src_ds.variables and src_ds.variables[dim].dimensions == (dim,):
+                    coord = src_ds.variables[dim]
+                    out_coord = ds.createVariable(dim, coord.dtype, (dim,))
+                    out_coord.setncatts({k: coord.getncattr(k) for k in coord.ncattrs()
+                                         if k != '_FillValue'})
+                    out_coord[:] = coord[:]
+            var = ds.createVariable(variable_name, 'f4', leading + ('lat', 'lon'),
+                                    zlib=True, fill_value=np.float32(1e20))
+
+            if not leading:
+                var[:] = np.ma.masked_invalid(weights.apply(src_var[:]))
+                return
+            for start in range(0, src_var.shape[0], block_steps):
+                block = slice(start, start + block_steps)
+                var[block] = np.ma.masked_invalid(weights.apply(src_var[block]))
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Regrid NetCDF files onto a common grid")
+    parser.add_argument("files", nargs="+", help="Source NetCDF files")
+    parser.add_argument("--variable", required=True, help="Variable to regrid")
+    parser.add_argument("--method", choices=METHODS, default="conservative")
+    parser.add_argument("--target", choices=["cmip6", "regular"], default="cmip6",
+                        help="Target grid: the climate_grid_data CMIP6 grid, or a regular "
+                             "global grid at --resolution (default: cmip6)")
+    parser.add_argument("--resolution", type=float, default=5.0,
+                        help="Resolution in degrees of the regular target grid (default: 5)")
+    parser.add_argument("--output-dir", default=".", help="Directory for regridded files")
+    args = parser.parse_args()
+
+    if args.target == "cmip6":
+        target = Grid(CMIP6_GRID_LATS, CMIP6_GRID_LONS)
+        suffix = "cmip6grid"
+    else:
+        target = Grid.regular(args.resolution)
+        suffix = f"{args.resolution:g}deg"
+    print(f"Target grid: {target.shape[0]} lat x {target.shape[1]} lon ({args.method})")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for path in args.files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        out_path = os.path.join(args.output_dir, f"{name}_{args.method}_{suffix}.nc")
+        try:
+            regrid_netcdf(path, args.variable, target, out_path, args.method)
+        except Exception as e:
+            print(f"  Error regridding {path}: {e}")
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            continue
+        print(f"  {path} -> {out_path}")
+
+if __name__ == "__main__":
+    main()
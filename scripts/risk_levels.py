@@ -0,0 +1,167 @@
+"""
+Import-time Risk Classification
+
+Classifies climate_grid_data values into risk levels with the threshold
+table in shared/riskThresholds.json, the same table the server's
+calculateRiskLevel reads, and computes a weighted multi-hazard composite
+score per grid point, scenario and period for climate_composite_scores.
+Only indicators with a composite weight enter the score. Rows carry the
+table version they were classified with; the server reclassifies rows
+whose version is stale.
+"""
+
+import os
+import json
+import numpy as np
+from psycopg2.extras import execute_values
+from pipelined_writer import advisory_xact_lock
+
+THRESHOLDS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "shared", "riskThresholds.json"
+)
+
+with open(THRESHOLDS_PATH) as f:
+    THRESHOLD_TABLE = json.load(f)
+
+THRESHOLDS_VERSION = THRESHOLD_TABLE["version"]
+RISK_LEVELS = THRESHOLD_TABLE["levels"]
+HIGH_LEVEL = RISK_LEVELS.index("high")
+COMPOSITE_WEIGHTS = THRESHOLD_TABLE["compositeWeights"]
+
+COMPOSITE_INSERT_SQL = """INSERT INTO climate_composite_scores
+   (source, scenario, time_period, latitude, longitude, score, hazard_count,
+    dominant_indicator, thresholds_version)
+   VALUES %s"""
+
+def is_descending(indicator_id):
+    """Indicators where more negative values are riskier, as in calculateRiskLevel"""
+    return "change" in indicator_id or indicator_id == "drought_severity"
+
+def thresholds_for(indicator_id, unit=None):
+    """Thresholds for an indicator, preferring a table for the value's unit"""
+    by_unit = THRESHOLD_TABLE["unitThresholds"].get(indicator_id, {})
+    if unit in by_unit:
+        return by_unit[unit]
+    return THRESHOLD_TABLE["thresholds"].get(indicator_id, THRESHOLD_TABLE["default"])
+
+def classify(indicator_id, values, unit=None):
+    """
+    Risk level indices (0 = low ... 4 = extreme) for an array of values.
+
+    Mirrors the if-chain in calculateRiskLevel exactly, including tables
+    that are not monotonic: the level is the first threshold the value
+    falls short of (ascending) or exceeds (descending).
+    """
+    values = np.asarray(values, dtype=float)
+    thresholds = np.asarray(thresholds_for(indicator_id, unit))
+    if is_descending(indicator_id):
+        hit = values[..., None] > thresholds
+    else:
+        hit = values[..., None] < thresholds
+    levels = np.where(hit.any(axis=-1), hit.argmax(axis=-1), len(thresholds))
+    if is_descending(indicator_id):
+        levels = np.where(values >= 0, 0, levels)
+    return levels
+
+def with_risk_levels(records):
+    """Append risk_level and thresholds_version to climate_grid_data records"""
+    by_indicator = {}
+    for i, record in enumerate(records):
+        by_indicator.setdefault((record[1], record[7]), []).append(i)
+
+    names = [None] * len(records)
+    level_names = np.asarray(RISK_LEVELS)
+    for (indicator_id, unit), rows in by_indicator.items():
+        levels = classify(indicator_id, [records[i][6] for i in rows], unit)
+        for i, name in zip(rows, level_names[levels]):
+            names[i] = str(name)
+
+    return [tuple(record) + (name, THRESHOLDS_VERSION) for record, name in zip(records, names)]
+
+def composite_scores(indicator_ids, values, units, cells, n_cells):
+    """
+    Weighted composite per cell from one value per (cell, indicator).
+    Indicators without a composite weight are ignored.
+
+    Returns (score, hazard_count, dominant) arrays of length n_cells: score
+    is the weighted mean risk level scaled to 0-100, hazard_count the
+    number of indicators at 'high' or above, and dominant the row index of
+    the largest weighted contribution (-1 when every indicator is low).
+    """
+    cells = np.asarray(cells)
+    values = np.asarray(values, dtype=float)
+    levels = np.zeros(len(values), dtype=int)
+    weights = np.zeros(len(values))
+    by_indicator = {}
+    for i, key in enumerate(zip(indicator_ids, units)):
+        by_indicator.setdefault(key, []).append(i)
+    for (indicator_id, unit), rows in by_indicator.items():
+        if indicator_id not in COMPOSITE_WEIGHTS:
+            continue
+        levels[rows] = classify(indicator_id, values[rows], unit)
+        weights[rows] = COMPOSITE_WEIGHTS[indicator_id]
+
+    contribution = weights * levels
+    total_weight = np.bincount(cells, weights=weights, minlength=n_cells)
+    weighted_level = np.bincount(cells, weights=contribution, minlength=n_cells)
+    max_level = len(RISK_LEVELS) - 1
+    score = np.divide(weighted_level, total_weight, out=np.zeros(n_cells), where=total_weight > 0)
+    score = score / max_level * 100
+    hazard_count = np.bincount(cells, weights=(levels >= HIGH_LEVEL) & (weights > 0),
+                               minlength=n_cells).astype(int)
+
+    # Last row per cell after sorting by (cell, contribution) is the largest
+    order = np.lexsort((contribution, cells))
+    last = np.r_[cells[order][1:] != cells[order][:-1], True]
+    dominant = np.full(n_cells, -1)
+    top = order[last]
+    dominant[cells[top]] = np.where(contribution[top] > 0, top, -1)
+    return score, hazard_count, dominant
+
+def refresh_composite_scores(cur, source, scenario=None, time_period=None):
+    """
+    Recompute climate_composite_scores for a source from its median rows,
+    optionally limited to one scenario and/or period. Runs in the caller's
+    transaction; returns the number of cells written.
+
+    Refreshes of a source are serialized with an advisory lock, so concurrent
+    writers cannot both delete and then both insert the same cells.
+    """
+    advisory_xact_lock(cur, "composite", source)
+    conditions = ["source = %s"]
+    params = [source]
+    if scenario is not None:
+        conditions.append("scenario = %s")
+        params.append(scenario)
+    if time_period is not None:
+        conditions.append("time_period = %s")
+        params.append(time_period)
+    scope = " AND ".join(conditions)
+
+    cur.execute(
+        f"""SELECT scenario, time_period, latitude, longitude, indicator_id, value, unit
+           FROM climate_grid_data WHERE {scope} AND percentile = 50""",
+        params
+    )
+    rows = cur.fetchall()
+    cur.execute(f"DELETE FROM climate_composite_scores WHERE {scope}", params)
+    if not rows:
+        return 0
+
+    cell_index = {}
+    cells = [cell_index.setdefault(row[:4], len(cell_index)) for row in rows]
+    indicator_ids = [row[4] for row in rows]
+    score, hazard_count, dominant = composite_scores(
+        indicator_ids, [row[5] for row in rows], [row[6] for row in rows], cells, len(cell_index)
+    )
+
+    records = []
+    for (cell_scenario, cell_period, lat, lon), i in cell_index.items():
+        records.append((
+            source, cell_scenario, cell_period, lat, lon,
+            round(float(score[i]), 2), int(hazard_count[i]),
+            indicator_ids[dominant[i]] if dominant[i] >= 0 else None,
+            THRESHOLDS_VERSION,
+        ))
+    execute_values(cur, COMPOSITE_INSERT_SQL, records, page_size=1000)
+    return len(records)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Zonal Statistics
+
+Aggregates climate_grid_data onto regions (countries, regions,
+municipalities) from a local GeoJSON file. Region polygons are rasterized
+onto the import grid once, with cell-coverage and latitude-area weighting,
+and cached as a sparse region x cell matrix. Area-weighted means for every
+indicator x scenario x period then come from a single matrix product; max
+and weighted percentiles are reduced per region over all slices at once.
+
+Usage:
+    python scripts/zonal_stats.py countries.geojson --source cmip6 --level country \
+        --id-property ISO_A3 --name-property NAME
+"""
+
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+import psycopg2
+
+from regrid import CACHE_DIR as REGRID_CACHE_DIR, SparseWeights
+from pipelined_writer import PipelinedWriter
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+CACHE_DIR = os.path.join(os.path.dirname(REGRID_CACHE_DIR), "zonal")
+
+# Sub-samples per cell side used to estimate polygon coverage of a cell
+COVERAGE_SUBSAMPLES = 4
+
+AGGREGATE_PERCENTILE = 90
+
+# Max (points x polygon edges) elements tested at once
+POLYGON_TEST_ELEMENTS = 4_000_000
+
+# Bumped when region_weights changes, to invalidate cached matrices
+REGION_WEIGHTS_VERSION = 2
+
+AGGREGATE_COLUMNS = [
+    "region_id", "region_name", "region_level", "source", "indicator_id", "scenario",
+    "time_period", "mean_value", "max_value", "p90_value", "cell_count",
+]
+
+AGGREGATE_INSERT_SQL = f"""INSERT INTO climate_region_aggregates
+   ({', '.join(AGGREGATE_COLUMNS)})
+   VALUES %s"""
+
+def get_db_connection():
+    if not DATABASE_URL:
+        print("Error: DATABASE_URL environment variable not set")
+        sys.exit(1)
+    return psycopg2.connect(DATABASE_URL)
+
+def load_regions(geojson_path, id_property, name_property=None):
+    """
+    Read Polygon/MultiPolygon features from a GeoJSON file.
+
+    Returns a list of {'id', 'name', 'polygons'} where polygons is a list of
+    rings lists (exterior first, then holes) as (n, 2) lon/lat arrays.
+    """
+    with open(geojson_path) as f:
+        collection = json.load(f)
+
+    regions = []
+    for feature in collection.get("features", []):
+        geometry = feature.get("geometry") or {}
+        props = feature.get("properties") or {}
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            continue
+
+        region_id = props.get(id_property, feature.get("id"))
+        if region_id is None:
+            continue
+        regions.append({
+            "id": str(region_id),
+            "name": props.get(name_property) if name_property else None,
+            "polygons": [[np.asarray(ring, dtype=float)[:, :2] for ring in polygon] for polygon in polygons],
+        })
+    return regions
+
+def points_in_polygon(lons, lats, rings):
+    """Even-odd ray casting of many points against one polygon (with holes)"""
+    inside = np.zeros(len(lons), dtype=bool)
+    for ring in rings:
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (x2 - x1) / (y2 - y1)
+        # Bound the (points x edges) temporaries for detailed coastlines
+        block = max(1, POLYGON_TEST_ELEMENTS // len(x1))
+        for start in range(0, len(lons), block):
+            px = lons[start:start + block, None]
+            py = lats[start:start + block, None]
+            # Edges that straddle each point's latitude, crossed to its east
+            straddles = (y1 > py) != (y2 > py)
+            with np.errstate(invalid='ignore'):
+                x_cross = x1 + (py - y1) * slope
+            crossings = np.sum(straddles & (px < x_cross), axis=1)
+            inside[start:start + block] ^= (crossings % 2).astype(bool)
+    return inside
+
+def infer_cell_size(lats, lons):
+    """Grid spacing in degrees if the points form a full regular grid, else None"""
+    u_lat, u_lon = np.unique(lats), np.unique(lons)
+    if len(u_lat) < 2 or len(u_lon) < 2 or len(u_lat) * len(u_lon) != len(lats):
+        return None
+    return float(min(np.min(np.diff(u_lat)), np.min(np.diff(u_lon))))
+
+def representative_point(region):
+    """Centroid (lon, lat) of the region's largest exterior ring"""
+    best, best_area = None, -1.0
+    for polygon in region["polygons"]:
+        ring = polygon[0]
+        x, y = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x, -1), np.roll(y, -1)
+        cross = x * y2 - x2 * y
+        signed_area = cross.sum() / 2
+        if abs(signed_area) > best_area:
+            best_area = abs(signed_area)
+            if signed_area == 0:
+                best = (float(x.mean()), float(y.mean()))
+            else:
+                best = (float(((x + x2) * cross).sum() / (6 * signed_area)),
+                        float(((y + y2) * cross).sum() / (6 * signed_area)))
+    return best
+
+def containing_point(lats, lons, lon, lat, cell_size=None):
+    """
+    Index of the grid point whose cell contains (lon, lat), or the nearest
+    point without a cell size; None if the location is outside the grid.
+    """
+    d_lon = (lons - lon + 180) % 360 - 180
+    d_lat = lats - lat
+    nearest = int(np.argmin(d_lat ** 2 + (d_lon * np.cos(np.radians(lat))) ** 2))
+    if cell_size and (abs(d_lat[nearest]) > cell_size / 2 or abs(d_lon[nearest]) > cell_size / 2):
+        return None
+    return nearest
+
+def region_weights(regions, lats, lons, cell_size=None, subsamples=COVERAGE_SUBSAMPLES):
+    """
+    Sparse (region x point) weights: polygon coverage of each cell times its
+    relative area. Without a cell size, points are weighted by cos(latitude)
+    if they fall inside the region. Regions smaller than the sample spacing
+    (e.g. municipalities on a coarse grid) get the cell containing their
+    centroid with full coverage.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+
+    if cell_size:
+        offsets = (np.arange(subsamples) + 0.5) / subsamples - 0.5
+        d_lat, d_lon = np.meshgrid(offsets * cell_size, offsets * cell_size, indexing='ij')
+        sample_lats = (lats[:, None] + d_lat.ravel()[None, :]).ravel()
+        sample_lons = (lons[:, None] + d_lon.ravel()[None, :]).ravel()
+        n_samples = subsamples * subsamples
+    else:
+        sample_lats, sample_lons, n_samples = lats, lons, 1
+
+    area = np.cos(np.radians(lats))
+    rows, cols, values = [], [], []
+
+    for r, region in enumerate(regions):
+        # Only test samples inside the region's bounding box
+        all_rings = np.concatenate([ring for polygon in region["polygons"] for ring in polygon])
+        lon_min, lat_min = all_rings.min(axis=0)
+        lon_max, lat_max = all_rings.max(axis=0)
+        candidates = np.nonzero(
+            (sample_lats >= lat_min) & (sample_lats <= lat_max) &
+            (sample_lons >= lon_min) & (sample_lons <= lon_max)
+        )[0]
+
+        inside = np.zeros(len(candidates), dtype=bool)
+        for polygon in region["polygons"]:
+            inside |= points_in_polygon(sample_lons[candidates], sample_lats[candidates], polygon)
+
+        coverage = np.bincount(candidates[inside] // n_samples, minlength=len(lats)) / n_samples
+        points = np.nonzero(coverage)[0]
+        if len(points) == 0:
+            lon, lat = representative_point(region)
+            point = containing_point(lats, lons, lon, lat, cell_size)
+            if point is None:
+                continue
+            coverage[point] = 1.0
+            points = np.array([point])
+        rows.append(np.full(len(points), r))
+        cols.append(points)
+        values.append(coverage[points] * area[points])
+
+    if rows:
+        rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+    else:
+        rows = cols = np.zeros(0, dtype=int)
+        values = np.zeros(0)
+    return SparseWeights.from_coo(rows, cols, values, (1, len(lats)), (1, len(regions)))
+
+def get_region_weights(geojson_path, regions, lats, lons, cell_size=None, cache_dir=CACHE_DIR):
+    """Region weights for a point set, cached on disk by GeoJSON content and grid"""
+    h = hashlib.sha1()
+    with open(geojson_path, 'rb') as f:
+        h.update(f.read())
+    h.update(np.ascontiguousarray(lats, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(lons, dtype=np.float64).tobytes())
+    h.update(f"{cell_size}_{COVERAGE_SUBSAMPLES}_{len(regions)}_{REGION_WEIGHTS_VERSION}".encode())
+
+    path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"regions_{h.hexdigest()[:16]}.npz")
+        if os.path.exists(path):
+            return SparseWeights.load(path)
+
+    weights = region_weights(regions, lats, lons, cell_size)
+    if path:
+        weights.save(path)
+    return weights
+
+def weighted_percentile(values, weights, q):
+    """Weighted percentile along axis 0 of a (n_points, n_slices) array, ignoring NaN"""
+    weights = np.where(np.isnan(values), 0.0, weights[:, None])
+    order = np.argsort(np.where(np.isnan(values), np.inf, values), axis=0)
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    cumulative = np.cumsum(np.take_along_axis(weights, order, axis=0), axis=0)
+    total = cumulative[-1]
+    idx = np.argmax(cumulative >= (q / 100.0) * total, axis=0)
+    result = sorted_values[idx, np.arange(values.shape[1])]
+    return np.where(total > 0, result, np.nan)
+
+def compute_aggregates(weights, values, percentile=AGGREGATE_PERCENTILE):
+    """
+    Zonal statistics of a (n_points, n_slices) value matrix.
+
+    Returns mean, max and weighted percentile arrays of shape
+    (n_regions, n_slices) plus the contributing point count per region.
+    """
+    valid = ~np.isnan(values)
+    numerator = weights.matvec(np.where(valid, values, 0.0).T).T
+    denominator = weights.matvec(valid.T.astype(float)).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(denominator > 0, numerator / denominator, np.nan)
+
+    n_regions = len(weights.indptr) - 1
+    maximum = np.full((n_regions, values.shape[1]), np.nan)
+    pct = np.full((n_regions, values.shape[1]), np.nan)
+    counts = np.diff(weights.indptr)
+    for r in np.nonzero(counts)[0]:
+        start, end = weights.indptr[r], weights.indptr[r + 1]
+        sub = values[weights.indices[start:end]]
+        has_data = valid[weights.indices[start:end]].any(axis=0)
+        with np.errstate(invalid='ignore'):
+            maximum[r, has_data] = np.nanmax(sub[:, has_data], axis=0)
+        pct[r] = weighted_percentile(sub, weights.data[start:end], percentile)
+
+    return mean, maximum, pct, counts
+
+def load_grid_values(cur, source):
+    """
+    Median values of a source as a (n_points, n_slices) matrix.
+
+    Returns lats, lons, slice keys (indicator, scenario, period) and values.
+    """
+    cur.execute(
+        """SELECT indicator_id, scenario, time_period, latitude, longitude, value
+           FROM climate_grid_data
+           WHERE source = %s AND percentile = 50""",
+        (source,)
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return None
+
+    point_index = {}
+    slice_index = {}
+    entries = []
+    for indicator_id, scenario, time_period, lat, lon, value in rows:
+        p = point_index.setdefault((lat, lon), len(point_index))
+        k = slice_index.setdefault((indicator_id, scenario, time_period), len(slice_index))
+        entries.append((p, k, value))
+
+    values = np.full((len(point_index), len(slice_index)), np.nan)
+    p_idx, k_idx, v = (np.array(col) for col in zip(*entries))
+    values[p_idx.astype(int), k_idx.astype(int)] = v.astype(float)
+
+    # Stable point order so cached region weights match across runs
+    points = np.array(list(point_index), dtype=float)
+    order = np.lexsort((points[:, 1], points[:, 0]))
+    return points[order, 0], points[order, 1], list(slice_index), values[order]
+
+def import_region_aggregates(geojson_path, source, level, id_property, name_property=None, cell_size=None):
+    """Compute and store zonal statistics of one source for a set of regions"""
+    print("=" * 60)
+    print("Climate Region Aggregates")
+    print("=" * 60)
+
+    regions = load_regions(geojson_path, id_property, name_property)
+    print(f"Regions: {len(regions)} ({level}) from {geojson_path}")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    loaded = load_grid_values(cur, source)
+    if loaded is None:
+        print(f"No {source} data in climate_grid_data")
+        cur.close()
+        conn.close()
+        return
+    lats, lons, slices, values = loaded
+    cell_size = cell_size or infer_cell_size(lats, lons)
+    print(f"Points: {len(lats)} ({'%g-degree cells' % cell_size if cell_size else 'point sampling'})")
+    print(f"Slices: {len(slices)} indicator x scenario x period")
+
+    weights = get_region_weights(geojson_path, regions, lats, lons, cell_size)
+    mean, maximum, pct, counts = compute_aggregates(weights, values)
+
+    cur.execute(
+        "DELETE FROM climate_region_aggregates WHERE source = %s AND region_level = %s",
+        (source, level)
+    )
+    print(f"Cleared {cur.rowcount} existing {source} {level} aggregates")
+
+    def as_value(x):
+        return None if np.isnan(x) else round(float(x), 4)
+
+    with PipelinedWriter(conn, AGGREGATE_INSERT_SQL, commit_each_batch=False) as writer:
+        records = []
+        for r, region in enumerate(regions):
+            if counts[r] == 0:
+                continue
+            for k, (indicator_id, scenario, time_period) in enumerate(slices):
+                if np.isnan(mean[r, k]):
+                    continue
+                records.append((
+                    region["id"], region["name"], level, source, indicator_id, scenario,
+                    time_period, as_value(mean[r, k]), as_value(maximum[r, k]),
+                    as_value(pct[r, k]), int(counts[r])
+                ))
+            if len(records) >= 2000:
+                writer.submit(records)
+                records = []
+        writer.submit(records)
+
+    covered = int(np.count_nonzero(counts))
+    print(f"\nRegions with data: {covered} of {len(regions)}")
+    cur.close()
+    conn.close()
+    print("\nAggregation complete!")
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="Compute zonal statistics for regions")
+    parser.add_argument("geojson", help="GeoJSON file of region polygons")
+    parser.add_argument("--source", required=True, choices=["cmip6", "isimip"])
+    parser.add_argument("--level", required=True, help="Region level, e.g. country, region, municipality")
+    parser.add_argument("--id-property", required=True, help="Feature property with the region id")
+    parser.add_argument("--name-property", help="Feature property with the region name")
+    parser.add_argument("--cell-size", type=float,
+                        help="Grid cell size in degrees (default: inferred from the points)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    import_region_aggregates(args.geojson, args.source, args.level, args.id_property,
+                             args.name_property, args.cell_size)
@@ -9,7 +9,8 @@
  */
 
 import { db } from "../db";
-import { climateGridData } from "@shared/schema";
+import { climateGridData, cmip6PatternFields, globalWarmingTrajectories, type ClimateGridData, type Cmip6PatternField } from "@shared/schema";
+import riskThresholds from "@shared/riskThresholds.json";
 import { eq, and, sql } from "drizzle-orm";
 
 export interface PhysicalRiskIndicator {
@@ -230,46 +231,23 @@ export const TIME_PERIODS = [
   { id: "2090", name: "2080-2099", midpoint: 2090, isHistoric: false }
 ];
 
+// Imports may store uncertainty bands (e.g. p5/p50/p95); map and location views use the median
+const MEDIAN_PERCENTILE = 50;
+
 /**
  * Calculate risk level based on indicator value and thresholds
  */
 function calculateRiskLevel(
   indicatorId: string,
   value: number,
-  source: "cmip" | "isimip"
+  source: "cmip" | "isimip",
+  unit?: string | null
 ): "low" | "medium" | "high" | "very_high" | "extreme" {
-  // Define thresholds for each indicator (simplified for demonstration)
-  const thresholds: { [key: string]: number[] } = {
-    // Temperature indicators (°C change)
-    tas: [1, 2, 3, 4],
-    tasmax: [2, 4, 6, 8],
-    tasmin: [1, 2, 3, 4],
-    // Hot days
-    hd35: [10, 30, 60, 100],
-    hd40: [5, 15, 30, 60],
-    // Heat waves
-    hwf: [2, 5, 10, 20],
-    // Precipitation (mm change)
-    pr: [-0.5, -1, -2, -3],
-    // Drought
-    cdd: [30, 60, 90, 120],
-    drought_severity: [-1, -1.5, -2, -2.5],
-    // Flood
-    r95p: [50, 100, 200, 400],
-    flood_depth: [0.5, 1, 2, 4],
-    // Sea level
-    slr: [0.2, 0.4, 0.6, 1],
-    // Water stress
-    water_stress: [20, 40, 60, 80],
-    // Other
-    crop_yield_change: [-10, -20, -30, -50],
-    wildfire_risk: [20, 40, 60, 80],
-    tropical_cyclone: [33, 50, 70, 100],
-    river_discharge: [-20, -40, 50, 100],
-    heat_mortality: [5, 20, 50, 100]
-  };
+  // Thresholds are shared with the Python importers, which store levels at import time
+  const thresholds: { [key: string]: number[] } = riskThresholds.thresholds;
+  const unitThresholds: { [key: string]: { [unit: string]: number[] } } = riskThresholds.unitThresholds;
 
-  const levels = thresholds[indicatorId] || [25, 50, 75, 90];
+  const levels = (unit && unitThresholds[indicatorId]?.[unit]) || thresholds[indicatorId] || riskThresholds.default;
   
   // Handle negative thresholds (like crop yield change)
   if (indicatorId.includes("change") || indicatorId === "drought_severity") {
@@ -288,6 +266,112 @@ function calculateRiskLevel(
   return "extreme";
 }
 
+/**
+ * Use the risk level stored at import time when it was classified with the
+ * current threshold table, otherwise classify the value now
+ */
+function resolveRiskLevel(
+  row: { indicatorId: string; value: number; unit: string | null; riskLevel: string | null; thresholdsVersion: number | null },
+  source: "cmip" | "isimip"
+): RiskDataPoint["riskLevel"] {
+  if (row.riskLevel && row.thresholdsVersion === riskThresholds.version) {
+    return row.riskLevel as RiskDataPoint["riskLevel"];
+  }
+  return calculateRiskLevel(row.indicatorId, row.value, source, row.unit);
+}
+
+// Units of the CMIP6 indicators evaluated from pattern fields (as in scripts/import_cmip6_grid.py)
+const PATTERN_INDICATOR_UNITS: { [key: string]: string } = {
+  tas: "°C",
+  tasmax: "°C",
+  tasmin: "°C",
+  pr: "mm/year",
+  hd35: "days",
+  cdd: "days"
+};
+
+function roundTo(value: number, digits: number): number {
+  const factor = Math.pow(10, digits);
+  return Math.round(value * factor) / factor;
+}
+
+/**
+ * Evaluate the CMIP6 indicators of one pattern cell at a global warming level.
+ * Port of evaluate_pattern in scripts/import_cmip6_grid.py.
+ */
+function evaluatePatternCell(cell: Cmip6PatternField, globalWarming: number): { [key: string]: number } {
+  const tas = roundTo(globalWarming * cell.tasPattern, 2);
+
+  let pr = cell.baselinePrecip * (1 + cell.precipSensitivity * globalWarming / 100);
+  pr = roundTo(Math.max(50, pr * cell.prVariation), 1);
+
+  const baseHotDays = Math.max(0, (cell.baselineTemp - 20) * 5);
+  const hotDays = cell.baselineTemp + tas > 25 ? baseHotDays * (1 + tas * 0.3) : 0;
+  const hd35 = Math.round(Math.min(180, Math.max(0, hotDays * cell.hdVariation)));
+
+  const baseCdd = Math.max(5, 150 - pr / 10);
+  const cdd = Math.round(Math.min(200, Math.max(5, baseCdd * (1 + globalWarming * 0.05) * cell.cddVariation)));
+
+  return { tas, tasmax: tas * 1.2, tasmin: tas * 0.85, pr, hd35, cdd };
+}
+
+/**
+ * CMIP6 rows evaluated at query time from cmip6_pattern_fields and the
+ * scenario's warming trajectory, for imports run with --pattern-scaling
+ * instead of materializing climate_grid_data.
+ */
+async function queryPatternScaledRows(
+  scenario: string,
+  timePeriod: string,
+  bounds: { north: number; south: number; east: number; west: number },
+  indicatorIds?: string[]
+): Promise<ClimateGridData[]> {
+  const year = parseInt(timePeriod, 10);
+  if (isNaN(year)) return [];
+
+  const [trajectory] = await db.select()
+    .from(globalWarmingTrajectories)
+    .where(and(
+      eq(globalWarmingTrajectories.scenario, scenario),
+      eq(globalWarmingTrajectories.year, year)
+    ))
+    .limit(1);
+  if (!trajectory) return [];
+
+  const cells = await db.select()
+    .from(cmip6PatternFields)
+    .where(and(
+      sql`${cmip6PatternFields.latitude} BETWEEN ${bounds.south} AND ${bounds.north}`,
+      sql`${cmip6PatternFields.longitude} BETWEEN ${bounds.west} AND ${bounds.east}`
+    ));
+
+  const rows: ClimateGridData[] = [];
+  for (const cell of cells) {
+    const values = evaluatePatternCell(cell, trajectory.globalWarming);
+    for (const [indicatorId, value] of Object.entries(values)) {
+      if (indicatorIds && !indicatorIds.includes(indicatorId)) continue;
+      rows.push({
+        id: `${cell.id}:${indicatorId}`,
+        source: "cmip6",
+        indicatorId,
+        scenario,
+        timePeriod,
+        latitude: cell.latitude,
+        longitude: cell.longitude,
+        value,
+        unit: PATTERN_INDICATOR_UNITS[indicatorId],
+        model: cell.model,
+        percentile: MEDIAN_PERCENTILE,
+        dataSource: "CMIP6 pattern scaling",
+        riskLevel: null,
+        thresholdsVersion: null,
+        updatedAt: cell.updatedAt
+      });
+    }
+  }
+  return rows;
+}
+
 /**
  * Deterministic pseudo-random number generator using location as seed
  * Produces consistent values for the same location
@@ -923,16 +1007,27 @@ async function queryDatabaseClimateData(
   
   for (const location of locations) {
     try {
-      const results = await db.select()
+      let results = await db.select()
         .from(climateGridData)
         .where(and(
           eq(climateGridData.source, dbSource),
           eq(climateGridData.scenario, scenario),
           eq(climateGridData.timePeriod, timePeriod),
+          eq(climateGridData.percentile, MEDIAN_PERCENTILE),
           sql`${climateGridData.latitude} BETWEEN ${location.latitude - searchRadius} AND ${location.latitude + searchRadius}`,
           sql`${climateGridData.longitude} BETWEEN ${location.longitude - searchRadius} AND ${location.longitude + searchRadius}`
         ));
       
+      // CMIP6 imported as pattern fields is evaluated here instead of read from rows
+      if (results.length === 0 && source === "cmip") {
+        results = await queryPatternScaledRows(scenario, timePeriod, {
+          north: location.latitude + searchRadius,
+          south: location.latitude - searchRadius,
+          east: location.longitude + searchRadius,
+          west: location.longitude - searchRadius
+        }, indicatorIds);
+      }
+      
       if (results.length === 0) continue;
       
       // Find nearest point
@@ -960,7 +1055,7 @@ async function queryDatabaseClimateData(
           scenario: record.scenario,
           timePeriod: record.timePeriod,
           value: record.value,
-          riskLevel: calculateRiskLevel(record.indicatorId, record.value, source),
+          riskLevel: resolveRiskLevel(record, source),
           percentile: record.percentile || 50
         });
       }
@@ -1066,24 +1161,30 @@ export async function generateGriddedRiskData(
   const dbSource = source === "cmip" ? "cmip6" : "isimip";
   
   // Query all data points from database within bounds
-  const dbResults = await db.select()
+  let dbResults = await db.select()
     .from(climateGridData)
     .where(and(
       eq(climateGridData.source, dbSource),
       eq(climateGridData.indicatorId, indicatorId),
       eq(climateGridData.scenario, scenario),
       eq(climateGridData.timePeriod, timePeriod),
+      eq(climateGridData.percentile, MEDIAN_PERCENTILE),
       sql`${climateGridData.latitude} BETWEEN ${bounds.south} AND ${bounds.north}`,
       sql`${climateGridData.longitude} BETWEEN ${bounds.west} AND ${bounds.east}`
     ));
   
+  // CMIP6 imported as pattern fields is evaluated here instead of read from rows
+  if (dbResults.length === 0 && source === "cmip") {
+    dbResults = await queryPatternScaledRows(scenario, timePeriod, bounds, [indicatorId]);
+  }
+  
   if (dbResults.length > 0) {
     console.log(`Grid data: Found ${dbResults.length} ${dbSource} records for ${indicatorId}/${scenario}/${timePeriod}`);
     return dbResults.map(row => ({
       lat: parseFloat(row.latitude),
       lng: parseFloat(row.longitude),
       value: parseFloat(row.value),
-      riskLevel: calculateRiskLevel(indicatorId, parseFloat(row.value), source)
+      riskLevel: resolveRiskLevel(row, source)
     }));
   }
   
@@ -1093,7 +1194,8 @@ export async function generateGriddedRiskData(
     .where(and(
       eq(climateGridData.source, dbSource),
       eq(climateGridData.scenario, scenario),
-      eq(climateGridData.timePeriod, timePeriod)
+      eq(climateGridData.timePeriod, timePeriod),
+      eq(climateGridData.percentile, MEDIAN_PERCENTILE)
     ))
     .limit(500);
   
@@ -1113,7 +1215,7 @@ export async function generateGriddedRiskData(
         lat: parseFloat(row.latitude),
         lng: parseFloat(row.longitude),
         value: parseFloat(row.value),
-        riskLevel: calculateRiskLevel(row.indicatorId, parseFloat(row.value), source)
+        riskLevel: resolveRiskLevel(row, source)
       }));
     }
   }
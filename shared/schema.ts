@@ -1,5 +1,5 @@
 import { sql } from "drizzle-orm";
-import { pgTable, text, varchar, jsonb, integer, real, timestamp, boolean } from "drizzle-orm/pg-core";
+import { pgTable, text, varchar, jsonb, integer, real, timestamp, boolean, index, uniqueIndex } from "drizzle-orm/pg-core";
 import { createInsertSchema } from "drizzle-zod";
 import { z } from "zod";
 
@@ -278,6 +278,8 @@ export const climateGridData = pgTable("climate_grid_data", {
   model: text("model"), // Climate model name e.g., 'MRI-AGCM3-2-S'
   percentile: integer("percentile"), // e.g., 50 for median
   dataSource: text("data_source"), // e.g., 'Open-Meteo', 'ISIMIP'
+  riskLevel: text("risk_level"), // classified at import time: 'low' through 'extreme'
+  thresholdsVersion: integer("thresholds_version"), // shared/riskThresholds.json version used for riskLevel
   updatedAt: timestamp("updated_at").default(sql`now()`),
 });
 
@@ -293,6 +295,123 @@ export const insertClimateGridDataSchema = createInsertSchema(climateGridData).o
 export type ClimateGridData = typeof climateGridData.$inferSelect;
 export type InsertClimateGridData = z.infer<typeof insertClimateGridDataSchema>;
 
+// CMIP6 Pattern Fields - Per-cell response patterns, scaled by a global warming level at query time
+export const cmip6PatternFields = pgTable("cmip6_pattern_fields", {
+  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  latitude: real("latitude").notNull(),
+  longitude: real("longitude").notNull(),
+  tasPattern: real("tas_pattern").notNull(), // °C local warming per °C global warming
+  baselineTemp: real("baseline_temp").notNull(), // °C, 1950-1980 mean
+  baselinePrecip: real("baseline_precip").notNull(), // mm/year
+  precipSensitivity: real("precip_sensitivity").notNull(), // % precipitation change per °C global warming
+  prVariation: real("pr_variation").notNull(), // multiplicative regional variation factors
+  hdVariation: real("hd_variation").notNull(),
+  cddVariation: real("cdd_variation").notNull(),
+  model: text("model"), // e.g., 'CMIP6-MMM'
+  updatedAt: timestamp("updated_at").default(sql`now()`),
+}, (table) => [
+  uniqueIndex("idx_cmip6_pattern_latlon").on(table.latitude, table.longitude),
+]);
+
+export type Cmip6PatternField = typeof cmip6PatternFields.$inferSelect;
+
+// Global Warming Trajectories - Annual global warming level (°C above pre-industrial) per scenario
+export const globalWarmingTrajectories = pgTable("global_warming_trajectories", {
+  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  scenario: text("scenario").notNull(), // e.g., 'ssp245'
+  year: integer("year").notNull(), // 2025-2100
+  globalWarming: real("global_warming").notNull(),
+  updatedAt: timestamp("updated_at").default(sql`now()`),
+}, (table) => [
+  uniqueIndex("idx_gwl_trajectory").on(table.scenario, table.year),
+]);
+
+export type GlobalWarmingTrajectory = typeof globalWarmingTrajectories.$inferSelect;
+
+// Import Runs - One row per climate data import run, used to resume interrupted imports
+export const importRuns = pgTable("import_runs", {
+  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  source: text("source").notNull(), // e.g., 'cmip6'
+  status: text("status").notNull(), // 'running', 'failed', 'completed', 'abandoned'
+  options: jsonb("options"), // import options, reused on resume
+  startedAt: timestamp("started_at").default(sql`now()`),
+  finishedAt: timestamp("finished_at"),
+});
+
+// Import Run Journal - Units of work committed by an import run
+export const importRunJournal = pgTable("import_run_journal", {
+  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  runId: varchar("run_id").notNull(),
+  indicatorId: text("indicator_id").notNull(),
+  scenario: text("scenario").notNull(),
+  timePeriod: text("time_period").notNull(),
+  chunk: integer("chunk").notNull(), // e.g., latitude band index
+  rowCount: integer("row_count").notNull(),
+  completedAt: timestamp("completed_at").default(sql`now()`),
+}, (table) => [
+  // A unit of work is journaled at most once per run
+  uniqueIndex("idx_import_journal_unit").on(table.runId, table.indicatorId, table.scenario, table.timePeriod, table.chunk),
+]);
+
+export type ImportRun = typeof importRuns.$inferSelect;
+export type ImportRunJournalEntry = typeof importRunJournal.$inferSelect;
+
+// Climate Region Aggregates - Area-weighted zonal statistics of climate_grid_data per region
+export const climateRegionAggregates = pgTable("climate_region_aggregates", {
+  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  regionId: text("region_id").notNull(), // e.g., ISO code or municipality id from the GeoJSON
+  regionName: text("region_name"),
+  regionLevel: text("region_level").notNull(), // 'country', 'region', 'municipality'
+  source: text("source").notNull(), // 'cmip6' or 'isimip'
+  indicatorId: text("indicator_id").notNull(),
+  scenario: text("scenario").notNull(),
+  timePeriod: text("time_period").notNull(),
+  meanValue: real("mean_value"), // area-weighted mean
+  maxValue: real("max_value"),
+  p90Value: real("p90_value"), // area-weighted 90th percentile
+  cellCount: integer("cell_count"), // grid points contributing
+  updatedAt: timestamp("updated_at").default(sql`now()`),
+}, (table) => [
+  // Region views are single-row reads off this index
+  index("idx_climate_region_agg").on(table.regionId, table.source, table.indicatorId, table.scenario, table.timePeriod),
+]);
+
+export type ClimateRegionAggregate = typeof climateRegionAggregates.$inferSelect;
+
+// Climate Composite Scores - weighted multi-hazard score per grid point, scenario and period
+export const climateCompositeScores = pgTable("climate_composite_scores", {
+  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  source: text("source").notNull(), // 'cmip6' or 'isimip'
+  scenario: text("scenario").notNull(),
+  timePeriod: text("time_period").notNull(),
+  latitude: real("latitude").notNull(),
+  longitude: real("longitude").notNull(),
+  score: real("score").notNull(), // 0 (all low) to 100 (all extreme)
+  hazardCount: integer("hazard_count").notNull(), // indicators at 'high' or above
+  dominantIndicator: text("dominant_indicator"), // largest weighted contribution
+  thresholdsVersion: integer("thresholds_version").notNull(),
+  updatedAt: timestamp("updated_at").default(sql`now()`),
+}, (table) => [
+  // Top-N riskiest cells per scenario and period read straight off this index
+  index("idx_climate_composite_rank").on(table.source, table.scenario, table.timePeriod, table.score.desc()),
+]);
+
+export type ClimateCompositeScore = typeof climateCompositeScores.$inferSelect;
+
+// Climate Ingest Files - NetCDF files processed by the ingestion daemon, deduplicated by checksum
+export const climateIngestFiles = pgTable("climate_ingest_files", {
+  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+  checksum: text("checksum").notNull().unique(), // sha256 of file contents
+  path: text("path").notNull(),
+  status: text("status").notNull(), // 'ingested', 'invalid', 'failed'
+  slices: integer("slices"), // indicator x scenario x period slices upserted
+  rowCount: integer("row_count"),
+  error: text("error"),
+  ingestedAt: timestamp("ingested_at").default(sql`now()`),
+});
+
+export type ClimateIngestFile = typeof climateIngestFiles.$inferSelect;
+
 // Economic Data - Cached time series from FRED, BEA, IMF, OECD, DBnomics, Data.gov
 export const economicData = pgTable("economic_data", {
   id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),